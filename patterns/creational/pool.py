@@ -16,7 +16,17 @@
 То же самое происходит с "sam", когда ObjectPool, созданный внутри функции,
 удаляется (сборщиком мусора), и объект возвращается.
 
+`BoundedObjectPool` - полноценный потокобезопасный пул: объекты создаются фабрикой
+ лениво, но не больше `max_size`; при старте создается `min_size` объектов (прогрев);
+ `get` ждет освободившийся объект не дольше `timeout`; перед выдачей объект проверяется
+ функцией `validate`, а простаивающие дольше `idle_ttl` объекты уничтожаются, пока
+ в пуле остается не меньше `min_size`.
+`AsyncObjectPool` - то же для asyncio: фабрика, проверка и уничтожение могут быть
+ корутинами, ожидающие обслуживаются строго по очереди, а объект, выданный отмененной
+ задаче, возвращается в пул.
+
 *Где это практически используется?
+Пулы соединений с базой данных, пулы потоков, переиспользуемые буферы.
 
 *Ссылки:
 http://stackoverflow.com/questions/1514120/python-implementation-of-the-object-pool-design-pattern
@@ -25,6 +35,13 @@ https://sourcemaking.com/design_patterns/object_pool
 *Кратко
 Сохраняет набор инициализированных объектов, готовых к использованию."""
 
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
 
 class ObjectPool:
     def __init__(self, queue, auto_get=False):
@@ -47,6 +64,499 @@ class ObjectPool:
             self.item = None
 
 
+class PoolClosed(Exception):
+    pass
+
+
+# что делать вызывающему, когда свободного объекта нет
+_CREATE = object()
+_WAIT = object()
+
+
+class _PoolPolicy:
+    """
+    Учет объектов пула без блокировок и ожидания: размер, свободные объекты
+    и вытеснение по времени простоя. Методы с подчеркиванием вызываются под
+    замком (или в цикле событий), а создание, проверка и уничтожение
+    объектов - снаружи, поэтому учет годится и для потоков, и для asyncio.
+    """
+
+    def __init__(
+        self,
+        factory,
+        min_size=0,
+        max_size=10,
+        idle_ttl=None,
+        validate=None,
+        dispose=None,
+        clock=time.monotonic,
+    ):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError("expected 0 <= min_size <= max_size and max_size >= 1")
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.validate = validate
+        self.dispose = dispose
+        self.clock = clock
+        self.size = 0  # созданные и еще не уничтоженные объекты
+        self.created = 0
+        self.discarded = 0
+        self.closed = False
+        # свободные объекты в порядке возврата: (объект, время возврата)
+        self._idle = deque()
+        # id(объект) -> [объект, сколько раз выдан]: фабрика может вернуть
+        # один и тот же объект дважды (строки, малые числа, синглтоны)
+        self._leased = {}
+        self._in_use = 0
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    def _take(self):
+        """Свободный объект, `_CREATE` (место под новый уже занято) или `_WAIT`."""
+        if self.closed:
+            raise PoolClosed
+        if self._idle:
+            # последний возвращенный: давно простаивающие остаются слева и вытесняются
+            item = self._idle.pop()[0]
+        elif self.size < self.max_size:
+            self.size += 1
+            return _CREATE
+        else:
+            return _WAIT
+        self._lease(item)
+        return item
+
+    def _created(self, item):
+        self.created += 1
+        self._lease(item)
+
+    def _lease(self, item):
+        lease = self._leased.get(id(item))
+        if lease is None:
+            self._leased[id(item)] = [item, 1]
+        else:
+            lease[1] += 1
+        self._in_use += 1
+
+    def _unlease(self, item):
+        lease = self._leased.get(id(item))
+        if lease is None:
+            raise ValueError("object does not belong to the pool")
+        lease[1] -= 1
+        if not lease[1]:
+            del self._leased[id(item)]
+        self._in_use -= 1
+
+    def _forget(self, item):
+        """Объект больше не принадлежит пулу, его место освобождается."""
+        self._unlease(item)
+        self.size -= 1
+        self.discarded += 1
+
+    def _give_back(self, item):
+        """Возвращает True, если объект снова свободен, и False, если его нужно уничтожить."""
+        self._unlease(item)
+        if self.closed:
+            self.size -= 1
+            return False
+        self._idle.append((item, self.clock()))
+        return True
+
+    def _add_idle(self, item):
+        """Добавляет созданный при прогреве объект, False если пул уже закрыт."""
+        self.created += 1
+        if self.closed:
+            self.size -= 1
+            return False
+        self._idle.append((item, self.clock()))
+        return True
+
+    def _expired(self):
+        """Забирает из пула простаивающие дольше `idle_ttl` объекты сверх `min_size`."""
+        expired = []
+        if self.idle_ttl is None:
+            return expired
+        deadline = self.clock() - self.idle_ttl
+        while self._idle and self._idle[0][1] <= deadline and self.size > self.min_size:
+            expired.append(self._idle.popleft()[0])
+            self.size -= 1
+            self.discarded += 1
+        return expired
+
+    def _missing(self):
+        """Сколько объектов нужно создать до `min_size`; места под них уже заняты."""
+        missing = max(self.min_size - self.size, 0)
+        self.size += missing
+        return missing
+
+    def _close(self):
+        self.closed = True
+        idle = [item for item, _ in self._idle]
+        self._idle.clear()
+        self.size -= len(idle)
+        return idle
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self.idle,
+            "in_use": self.in_use,
+            "created": self.created,
+            "discarded": self.discarded,
+        }
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} size={self.size}/{self.max_size}"
+            f" idle={self.idle} in_use={self.in_use}>"
+        )
+
+
+class BoundedObjectPool(_PoolPolicy):
+    """
+    Потокобезопасный пул объектов, создаваемых фабрикой.
+
+    >>> pool = BoundedObjectPool(list, max_size=1)
+    >>> with pool.acquire() as item:
+    ...     item.append(1)
+    >>> pool.get()
+    [1]
+    >>> pool.get(timeout=0)
+    Traceback (most recent call last):
+    ...
+    TimeoutError: no free object in the pool
+    """
+
+    def __init__(self, factory, min_size=0, max_size=10, **kwargs):
+        super().__init__(factory, min_size, max_size, **kwargs)
+        self._condition = threading.Condition()
+        self.warm_up()
+
+    def warm_up(self):
+        """Создает объекты до `min_size`."""
+        with self._condition:
+            missing = self._missing()
+        for created in range(missing):
+            try:
+                item = self.factory()
+            except BaseException:
+                # места под еще не созданные объекты тоже освобождаются
+                self._release_slot(missing - created)
+                raise
+            with self._condition:
+                added = self._add_idle(item)
+                self._condition.notify()
+            if not added:
+                self._dispose(item)
+
+    def get(self, timeout=None):
+        """
+        Выдает свободный объект, создает новый, если пул не заполнен,
+        или ждет возврата не дольше `timeout` секунд.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._condition:
+                expired = self._expired()
+                item = self._take()
+                while item is _WAIT:
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                    expired += self._expired()
+                    item = self._take()
+            for stale in expired:
+                self._dispose(stale)
+            if item is _WAIT:
+                raise TimeoutError("no free object in the pool")
+            if item is _CREATE:
+                try:
+                    item = self.factory()
+                except BaseException:
+                    self._release_slot()
+                    raise
+                with self._condition:
+                    self._created(item)
+                return item
+            if self.validate is None or self._is_valid(item):
+                return item
+            self.discard(item)
+
+    def _is_valid(self, item):
+        try:
+            return self.validate(item)
+        except Exception:
+            return False
+
+    def _release_slot(self, count=1):
+        with self._condition:
+            self.size -= count
+            self._condition.notify(count)
+
+    def put(self, item):
+        """Возвращает выданный объект в пул."""
+        with self._condition:
+            returned = self._give_back(item)
+            expired = self._expired()
+            self._condition.notify()
+        if not returned:
+            expired.append(item)
+        for stale in expired:
+            self._dispose(stale)
+
+    def discard(self, item):
+        """Уничтожает выданный объект (например, сломанный) вместо возврата в пул."""
+        with self._condition:
+            self._forget(item)
+            self._condition.notify()
+        self._dispose(item)
+
+    def evict_idle(self):
+        """Уничтожает просроченные свободные объекты; удобно вызывать периодически."""
+        with self._condition:
+            expired = self._expired()
+        for stale in expired:
+            self._dispose(stale)
+        return len(expired)
+
+    def _dispose(self, item):
+        if self.dispose is not None:
+            self.dispose(item)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        item = self.get(timeout)
+        try:
+            yield item
+        finally:
+            self.put(item)
+
+    def close(self):
+        """Уничтожает свободные объекты; выданные уничтожаются при возврате."""
+        with self._condition:
+            idle = self._close()
+            self._condition.notify_all()
+        for item in idle:
+            self._dispose(item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+async def _call(function, *args):
+    """Вызывает обычную функцию или корутину."""
+    result = function(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class AsyncObjectPool(_PoolPolicy):
+    """
+    Пул объектов для asyncio с той же политикой размера и вытеснения,
+    что у `BoundedObjectPool`.
+
+    Ожидающие `get` стоят в очереди FIFO: возвращенный объект (или место
+    под новый) передается первому из них напрямую, и новый вызов `get` не
+    может обогнать очередь. Учет ведется без `await`, поэтому отмена задачи
+    не теряет объекты: выданный отмененной задаче объект возвращается в пул.
+
+    >>> async def demo():
+    ...     async with AsyncObjectPool(list, max_size=1) as pool:
+    ...         async with pool.acquire() as item:
+    ...             item.append(1)
+    ...         return await pool.get()
+    >>> asyncio.run(demo())
+    [1]
+    """
+
+    def __init__(self, factory, min_size=0, max_size=10, **kwargs):
+        super().__init__(factory, min_size, max_size, **kwargs)
+        self._waiters = deque()
+        self._disposing = set()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def warm_up(self):
+        """Создает объекты до `min_size`."""
+        missing = self._missing()
+        for created in range(missing):
+            try:
+                item = await _call(self.factory)
+            except BaseException:
+                # места под еще не созданные объекты отдаются ожидающим по одному
+                for _ in range(missing - created):
+                    self._release_slot()
+                raise
+            if self._handoff(item):
+                self._created(item)
+            elif not self._add_idle(item):
+                await self._dispose([item])
+
+    def _handoff(self, item):
+        """Отдает объект или `_CREATE` первому ожидающему, если он есть."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(item)
+                return True
+        return False
+
+    def _release_slot(self):
+        self.size -= 1
+        if self._handoff(_CREATE):
+            self.size += 1
+
+    async def _wait(self, timeout):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait([waiter], timeout=timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and not waiter.exception():
+                # объект уже передан этой задаче: отдаем его следующему
+                self._pass_on(waiter.result())
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            if waiter.cancelled() and waiter in self._waiters:
+                self._waiters.remove(waiter)
+        if waiter.cancelled():
+            raise TimeoutError("no free object in the pool")
+        return waiter.result()
+
+    def _pass_on(self, item):
+        if item is _CREATE:
+            self._release_slot()
+        elif not self._handoff(item):
+            self._give_back(item)
+
+    async def get(self, timeout=None):
+        """
+        Выдает свободный объект, создает новый, если пул не заполнен,
+        или ждет в очереди не дольше `timeout` секунд.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            await self._dispose(self._expired())
+            item = _WAIT if self._waiters else self._take()
+            if item is _WAIT:
+                remaining = None if deadline is None else max(deadline - loop.time(), 0)
+                item = await self._wait(remaining)
+            if item is _CREATE:
+                try:
+                    item = await _call(self.factory)
+                except BaseException:
+                    self._release_slot()
+                    raise
+                self._created(item)
+            elif self.validate is not None and not await self._is_valid(item):
+                await self.discard(item)
+                continue
+            return item
+
+    async def _is_valid(self, item):
+        try:
+            return await _call(self.validate, item)
+        except asyncio.CancelledError:
+            self._pass_on(item)
+            raise
+        except Exception:
+            return False
+
+    async def put(self, item):
+        """Возвращает выданный объект в пул; учет завершается до первого `await`."""
+        if id(item) not in self._leased:
+            raise ValueError("object does not belong to the pool")
+        if not self.closed and self._handoff(item):
+            return
+        returned = self._give_back(item)
+        expired = self._expired()
+        if not returned:
+            expired.append(item)
+        await self._dispose(expired)
+
+    async def discard(self, item):
+        """Уничтожает выданный объект (например, сломанный) вместо возврата в пул."""
+        self._forget(item)
+        if self._handoff(_CREATE):
+            self.size += 1
+        await self._dispose([item])
+
+    async def evict_idle(self):
+        """Уничтожает просроченные свободные объекты; удобно вызывать периодически."""
+        expired = self._expired()
+        await self._dispose(expired)
+        return len(expired)
+
+    async def _dispose(self, items):
+        """
+        Уничтожает объекты, уже убранные из учета. Уничтожение идет в
+        отдельной задаче, поэтому отмена вызывающего не оставляет
+        неуничтоженных объектов; `close` дожидается таких задач.
+        """
+        if self.dispose is None or not items:
+            return
+        task = asyncio.ensure_future(self._dispose_each(items))
+        self._disposing.add(task)
+        task.add_done_callback(self._disposing.discard)
+        await asyncio.shield(task)
+
+    async def _dispose_each(self, items):
+        errors = []
+        for item in items:
+            try:
+                await _call(self.dispose, item)
+            except Exception as error:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    @asynccontextmanager
+    async def acquire(self, timeout=None):
+        item = await self.get(timeout)
+        try:
+            yield item
+        finally:
+            await self.put(item)
+
+    async def close(self):
+        """Уничтожает свободные объекты, ожидающие получают `PoolClosed`."""
+        idle = self._close()
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(PoolClosed())
+        await self._dispose(idle)
+        if self._disposing:
+            await asyncio.gather(*self._disposing, return_exceptions=True)
+
+    async def __aenter__(self):
+        await self.warm_up()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
 def main():
     """
     >>> import queue
@@ -11,40 +11,565 @@ https://en.wikipedia.org/wiki/Blackboard_system
 from __future__ import annotations
 
 import abc
+import asyncio
+import copy
+import itertools
+import os
+import pickle
 import random
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from heapq import heappop, heappush
+from time import perf_counter
+from types import MappingProxyType
+
+
+class TrackedState(dict):
+    """A dict that remembers which keys were assigned since the last `pop_changed`."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.changed = set()
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self.changed.add(key)
+
+    def pop_changed(self) -> set:
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def __reduce__(self):
+        # items are restored before `changed`, so rebuild from a plain dict
+        return self.__class__, (dict(self),)
+
+
+class Delta:
+    """Changes proposed by an expert: counter increments and new contributions."""
+
+    def __init__(self, increments=None, contributions=()) -> None:
+        self.increments = dict(increments or {})
+        self.contributions = list(contributions)
+
+    def apply(self, state: dict) -> None:
+        for key, value in self.increments.items():
+            state[key] += value
+        state["contributions"] += self.contributions
+
+
+class ContributionLog:
+    """
+    A compact stand-in for the list of contributing expert names.
+
+    Names are interned to ids kept in an `array('H')`, two bytes per
+    contribution instead of a list slot, so at most 65536 distinct experts
+    can be logged. With a `cap` the array becomes a ring buffer holding
+    only the latest `cap` contributions, while `counts` and `total` still
+    cover the whole run. Experts append with `+=` as they do to a list,
+    and `to_list` rebuilds the list view when it is needed.
+    """
+
+    def __init__(self, names=(), cap: int | None = None) -> None:
+        if cap is not None and cap < 1:
+            raise ValueError("cap must be positive")
+        self.cap = cap
+        self.total = 0
+        self.names = []  # expert id -> name
+        self._ids = {}
+        self._counts = []
+        self._entries = array("H")
+        self._head = 0  # oldest entry once the ring buffer is full
+        self += names
+
+    def append(self, name: str) -> None:
+        expert_id = self._ids.get(name)
+        if expert_id is None:
+            expert_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+            self._counts.append(0)
+        self._counts[expert_id] += 1
+        if self.cap is None or len(self._entries) < self.cap:
+            self._entries.append(expert_id)
+        else:
+            self._entries[self._head] = expert_id
+            self._head = (self._head + 1) % self.cap
+        self.total += 1
+
+    def __iadd__(self, names):
+        for name in names:
+            self.append(name)
+        return self
+
+    def ids(self) -> array:
+        """Retained expert ids, oldest first."""
+        head = self._head
+        return self._entries[head:] + self._entries[:head]
+
+    def last(self, count: int) -> list:
+        """The latest `count` names, oldest first, without copying the whole log."""
+        entries = self._entries
+        count = min(max(count, 0), len(entries))
+        if not count:
+            return []
+        end = self._head or len(entries)  # one past the newest entry
+        start = end - count
+        if start >= 0:
+            ids = entries[start:end]
+        else:  # wraps around the ring buffer
+            ids = entries[start:] + entries[:end]
+        return [self.names[expert_id] for expert_id in ids]
+
+    def counts(self) -> dict:
+        """Contributions per expert over the whole run, evicted ones included."""
+        return dict(zip(self.names, self._counts))
+
+    def to_list(self) -> list:
+        return list(self)
+
+    def __iter__(self):
+        return map(self.names.__getitem__, self.ids())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_list()!r}, cap={self.cap!r})"
 
 
 class Blackboard:
-    def __init__(self) -> None:
+    def __init__(self, contributions=None) -> None:
         self.experts = []
-        self.common_state = {
-            "problems": 0,
-            "suggestions": 0,
-            "contributions": [],
-            "progress": 0,  # percentage, if 100 -> task is finished
-        }
+        self.common_state = TrackedState(
+            {
+                "problems": 0,
+                "suggestions": 0,
+                # a `ContributionLog` keeps long runs compact
+                "contributions": [] if contributions is None else contributions,
+                "progress": 0,  # percentage, if 100 -> task is finished
+            }
+        )
 
     def add_expert(self, expert: AbstractExpert) -> None:
         self.experts.append(expert)
 
 
+class Checkpointer:
+    """
+    Periodically snapshots a blackboard so a long run can resume after a crash.
+
+    Every `every` contributions the controller hands over the blackboard
+    (its `common_state` and experts in their order), the state of the
+    `random` module and a controller cursor. They are pickled right away,
+    so the snapshot is consistent, and compressed and written by a
+    background thread. The file is replaced atomically, so it always holds
+    the latest complete snapshot. A failed write is raised from the next
+    `save` or from `close`, and `snapshots` only counts written ones.
+    Snapshots are pickles: only load files you wrote yourself.
+    """
+
+    MAGIC = b"BBCKPT\x01"
+
+    def __init__(self, path: str, every: int = 100) -> None:
+        self.path = path
+        self.every = every
+        self.snapshots = 0
+        self._pending = 0
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._last_write = None
+
+    def contributed(self, blackboard: Blackboard, cursor: int, count: int = 1) -> None:
+        self._pending += count
+        if self._pending >= self.every:
+            self._pending = 0
+            self.save(blackboard, cursor)
+
+    def save(self, blackboard: Blackboard, cursor: int = 0) -> None:
+        payload = (blackboard, random.getstate(), cursor)
+        data = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+        self._wait()
+        self._last_write = self._writer.submit(self._write, data)
+
+    def _wait(self) -> None:
+        """Waits for the previous write, raising its error if it failed."""
+        write, self._last_write = self._last_write, None
+        if write is not None:
+            write.result()
+            self.snapshots += 1
+
+    def _write(self, data: bytes) -> None:
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(self.MAGIC)
+            file.write(zlib.compress(data))
+        os.replace(temporary, self.path)
+
+    def close(self) -> None:
+        """Waits until every snapshot is on disk."""
+        try:
+            self._wait()
+        finally:
+            self._writer.shutdown(wait=True)
+
+    def __enter__(self) -> Checkpointer:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @classmethod
+    def load(cls, path: str):
+        """Restores the `random` state and returns the `(blackboard, cursor)` of a snapshot."""
+        with open(path, "rb") as file:
+            data = file.read()
+        header = len(cls.MAGIC)
+        if data[:header] != cls.MAGIC:
+            raise ValueError(f"{path!r} is not a blackboard checkpoint")
+        payload = zlib.decompress(data[header:])
+        blackboard, random_state, cursor = pickle.loads(payload)
+        random.setstate(random_state)
+        return blackboard, cursor
+
+
+class ExpertStats:
+    """Counters and timings of one expert, `position` is its index on the blackboard."""
+
+    def __init__(self, name: str, position: int) -> None:
+        self.name = name
+        self.position = position
+        self.checks = 0
+        self.check_time = 0.0
+        self.contributions = 0
+        self.contribute_time = 0.0
+        self.progress = 0
+
+    @property
+    def total_time(self) -> float:
+        return self.check_time + self.contribute_time
+
+    @property
+    def progress_per_second(self) -> float:
+        return self.progress / self.total_time if self.total_time else 0.0
+
+    def copy(self) -> ExpertStats:
+        stats = ExpertStats(self.name, self.position)
+        stats.__dict__.update(self.__dict__)
+        return stats
+
+
+class ProfileReport:
+    """A snapshot of every expert's `ExpertStats` after `elapsed` seconds of a run."""
+
+    def __init__(self, rows: list, elapsed: float) -> None:
+        self.rows = rows
+        self.elapsed = elapsed
+
+    def slowest(self) -> ExpertStats:
+        return max(self.rows, key=lambda row: row.total_time)
+
+    def __str__(self) -> str:
+        lines = [
+            f"{'#':>3} {'expert':<12} {'checks':>8} {'check s':>9} "
+            f"{'contribs':>8} {'contrib s':>9} {'progress/s':>10}"
+        ]
+        for row in self.rows:
+            lines.append(
+                f"{row.position:>3} {row.name:<12} {row.checks:>8} "
+                f"{row.check_time:>9.4f} {row.contributions:>8} "
+                f"{row.contribute_time:>9.4f} {row.progress_per_second:>10.1f}"
+            )
+        return "\n".join(lines)
+
+
+class ExpertProfiler:
+    """
+    Times every expert's eagerness checks and contributions.
+
+    Controllers given a profiler run over `instrument`-ed proxies of the
+    experts, so without one the loop is exactly the uninstrumented code.
+    `report` returns a `ProfileReport`; if `callback` is set it is also
+    called with a fresh report, at most once every `interval` seconds,
+    after a contribution.
+    """
+
+    def __init__(self, callback=None, interval: float = 1.0) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.stats = {}  # expert -> ExpertStats
+        self._started = self._reported = perf_counter()
+
+    def instrument(self, experts: list, state: dict) -> list:
+        self._started = self._reported = perf_counter()
+        proxies = []
+        for position, expert in enumerate(experts):
+            stats = self.stats.get(expert)
+            if stats is None:
+                stats = self.stats[expert] = ExpertStats(
+                    expert.__class__.__name__, position
+                )
+            proxies.append(_ProfiledExpert(expert, stats, self, state))
+        return proxies
+
+    def report(self) -> ProfileReport:
+        rows = [stats.copy() for stats in self.stats.values()]
+        return ProfileReport(rows, perf_counter() - self._started)
+
+    def _contributed(self, now: float) -> None:
+        if self.callback is not None and now - self._reported >= self.interval:
+            self._reported = now
+            self.callback(self.report())
+
+
+class _ProfiledExpert:
+    """Forwards to an expert and records the cost of each call in its stats."""
+
+    def __init__(self, expert, stats, profiler, state) -> None:
+        self._expert = expert
+        self._stats = stats
+        self._profiler = profiler
+        self._state = state
+
+    @property
+    def is_eager_to_contribute(self):
+        started = perf_counter()
+        try:
+            return self._expert.is_eager_to_contribute
+        finally:
+            self._stats.checks += 1
+            self._stats.check_time += perf_counter() - started
+
+    def contribute(self) -> None:
+        progress = self._state["progress"]
+        started = perf_counter()
+        self._expert.contribute()
+        now = perf_counter()
+        stats = self._stats
+        stats.contributions += 1
+        stats.contribute_time += now - started
+        stats.progress += self._state["progress"] - progress
+        self._profiler._contributed(now)
+
+    def __getattr__(self, name):
+        return getattr(self._expert, name)
+
+
 class Controller:
-    def __init__(self, blackboard: Blackboard) -> None:
+    def __init__(
+        self, blackboard: Blackboard, checkpointer=None, profiler=None
+    ) -> None:
         self.blackboard = blackboard
+        self.checkpointer = checkpointer
+        self.profiler = profiler
+        self.cursor = 0  # where `run_loop` starts, set when resuming
+
+    def _experts(self) -> list:
+        experts = self.blackboard.experts
+        if self.profiler is None:
+            return experts
+        return self.profiler.instrument(experts, self.blackboard.common_state)
+
+    @classmethod
+    def resume(cls, path: str, *args, **kwargs) -> Controller:
+        """Creates a controller that continues the run saved at `path`."""
+        blackboard, cursor = Checkpointer.load(path)
+        controller = cls(blackboard, *args, **kwargs)
+        controller.cursor = cursor
+        return controller
 
     def run_loop(self):
         """
         This function is a loop that runs until the progress reaches 100.
         It checks if an expert is eager to contribute and then calls its contribute method.
         """
-        while self.blackboard.common_state["progress"] < 100:
-            for expert in self.blackboard.experts:
+        experts = self._experts()
+        start, self.cursor = self.cursor, 0
+        # a snapshot taken mid-round resumes with the rest of that round
+        while start or self.blackboard.common_state["progress"] < 100:
+            for position in range(start, len(experts)):
+                expert = experts[position]
                 if expert.is_eager_to_contribute:
                     expert.contribute()
+                    if self.checkpointer is not None:
+                        # the cursor is the next expert of the round
+                        self.checkpointer.contributed(self.blackboard, position + 1)
+            start = 0
         return self.blackboard.common_state["contributions"]
 
 
+class AgendaController(Controller):
+    """
+    Runs experts from an agenda instead of polling all of them in turn.
+
+    An expert's eagerness is only re-evaluated when one of the
+    `common_state` keys listed in its `depends_on` changes, or right after
+    it contributed. Experts with `depends_on = None` are volatile and polled
+    after every contribution, as `Controller.run_loop` does. Eager experts
+    wait in a priority queue: the highest `priority` goes first, equal
+    priorities take turns in the order they became eager.
+    """
+
+    def __init__(
+        self, blackboard: Blackboard, checkpointer=None, profiler=None
+    ) -> None:
+        super().__init__(blackboard, checkpointer, profiler)
+        self.evaluations = 0
+
+    def run_loop(self):
+        state = self.blackboard.common_state
+        experts = self._experts()
+        dependents = {}
+        volatile = []
+        for expert in experts:
+            if expert.depends_on is None:
+                volatile.append(expert)
+            else:
+                for key in expert.depends_on:
+                    dependents.setdefault(key, []).append(expert)
+        counter = itertools.count()
+        agenda = []
+        queued = {}  # expert -> sequence number of its live agenda entry
+
+        def evaluate(expert) -> None:
+            self.evaluations += 1
+            if not expert.is_eager_to_contribute:
+                queued.pop(expert, None)
+            elif expert not in queued:
+                queued[expert] = sequence = next(counter)
+                heappush(agenda, (-expert.priority, sequence, expert))
+
+        for expert in experts:
+            evaluate(expert)
+        state.pop_changed()
+        while state["progress"] < 100:
+            if not agenda:
+                if not volatile:
+                    raise RuntimeError("no expert is eager to contribute")
+                for expert in volatile:
+                    evaluate(expert)
+                continue
+            _, sequence, expert = heappop(agenda)
+            if queued.get(expert) != sequence:
+                continue  # no longer eager since it was queued
+            del queued[expert]
+            expert.contribute()
+            if self.checkpointer is not None:
+                self.checkpointer.contributed(self.blackboard, 0)
+            affected = {expert: None}
+            for key in state.pop_changed():
+                affected.update(dict.fromkeys(dependents.get(key, ())))
+            affected.update(dict.fromkeys(volatile))
+            for other in affected:
+                evaluate(other)
+        return state["contributions"]
+
+
+class ParallelController(Controller):
+    """
+    Runs each round's eager experts concurrently in an executor.
+
+    Experts do not mutate the blackboard, they `propose` a `Delta` using
+    their own `random.Random`, seeded from `seed`, the round and the
+    expert's position. Deltas are applied in the order experts were added,
+    whatever order they finish in, so a run is reproducible for a given
+    seed with any number of workers. Eagerness is still checked on the
+    controller's thread. `executor` may be any `concurrent.futures`
+    executor. By default a thread pool of `max_workers` threads is used.
+
+    Each round the eager experts are split into one batch per worker and
+    sent with a copy of the counters, without the contributions. The
+    experts travel without their blackboard: in `propose` their
+    `blackboard.common_state` is that read-only copy. A process pool then
+    pickles a few numbers per batch, however long the run, and needs the
+    experts' other attributes to be picklable.
+    """
+
+    def __init__(
+        self,
+        blackboard: Blackboard,
+        executor=None,
+        max_workers=None,
+        seed=0,
+        checkpointer=None,
+    ) -> None:
+        super().__init__(blackboard, checkpointer)
+        self.executor = executor
+        self.max_workers = max_workers
+        self.seed = seed
+
+    def run_loop(self):
+        if self.executor is not None:
+            return self._run_rounds(self.executor)
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            return self._run_rounds(executor)
+
+    def _run_rounds(self, executor):
+        state = self.blackboard.common_state
+        start, self.cursor = self.cursor, 0
+        for round_number in itertools.count(start):
+            if state["progress"] >= 100:
+                return state["contributions"]
+            eager = [
+                (position, expert)
+                for position, expert in enumerate(self.blackboard.experts)
+                if expert.is_eager_to_contribute
+            ]
+            rngs = [
+                random.Random(f"{self.seed}:{round_number}:{position}")
+                for position, _ in eager
+            ]
+            handles = [_detach(expert) for _, expert in eager]
+            counters = {
+                key: value for key, value in state.items() if key != "contributions"
+            }
+            batches = self.max_workers or os.cpu_count() or 1
+            size = -(-len(handles) // batches) or 1
+            futures = []
+            for first in range(0, len(handles), size):
+                last = first + size
+                futures.append(
+                    executor.submit(
+                        _propose_batch, counters, handles[first:last], rngs[first:last]
+                    )
+                )
+            for future in futures:
+                for delta in future.result():
+                    delta.apply(state)
+            if self.checkpointer is not None:
+                # snapshots are taken between rounds, the cursor is the next round
+                self.checkpointer.contributed(
+                    self.blackboard, round_number + 1, len(handles)
+                )
+
+
+class _CountersView:
+    """Stands in for the blackboard of an expert proposing in an executor."""
+
+    def __init__(self, counters: dict) -> None:
+        self.common_state = MappingProxyType(counters)
+
+
+def _detach(expert):
+    """A shallow copy of `expert` without its blackboard, cheap to pickle."""
+    handle = copy.copy(expert)
+    handle.blackboard = None
+    return handle
+
+
+def _propose_batch(counters: dict, handles: list, rngs: list) -> list:
+    view = _CountersView(counters)
+    deltas = []
+    for handle, rng in zip(handles, rngs):
+        handle.blackboard = view
+        deltas.append(handle.propose(rng))
+    return deltas
+
+
 class AbstractExpert(metaclass=abc.ABCMeta):
+    # `common_state` keys the eagerness depends on, None means it may change any time
+    depends_on = None
+    # experts with a higher priority are picked first by `AgendaController`
+    priority = 0
+
     def __init__(self, blackboard: Blackboard) -> None:
         self.blackboard = blackboard
 
@@ -53,21 +578,34 @@ class AbstractExpert(metaclass=abc.ABCMeta):
     def is_eager_to_contribute(self):
         raise NotImplementedError("Must provide implementation in subclass.")
 
-    @abc.abstractmethod
-    def contribute(self):
+    def contribute(self) -> None:
+        self.propose(random).apply(self.blackboard.common_state)
+
+    def propose(self, rng) -> Delta:
+        """
+        Returns the changes this expert wants to make without touching the
+        blackboard, drawing random numbers from `rng` only, so that experts
+        can run in parallel and their deltas be merged afterwards.
+        """
         raise NotImplementedError("Must provide implementation in subclass.")
 
 
 class Student(AbstractExpert):
+    depends_on = ()
+
     @property
     def is_eager_to_contribute(self) -> bool:
         return True
 
-    def contribute(self) -> None:
-        self.blackboard.common_state["problems"] += random.randint(1, 10)
-        self.blackboard.common_state["suggestions"] += random.randint(1, 10)
-        self.blackboard.common_state["contributions"] += [self.__class__.__name__]
-        self.blackboard.common_state["progress"] += random.randint(1, 2)
+    def propose(self, rng) -> Delta:
+        return Delta(
+            {
+                "problems": rng.randint(1, 10),
+                "suggestions": rng.randint(1, 10),
+                "progress": rng.randint(1, 2),
+            },
+            [self.__class__.__name__],
+        )
 
 
 class Scientist(AbstractExpert):
@@ -75,23 +613,110 @@ class Scientist(AbstractExpert):
     def is_eager_to_contribute(self) -> int:
         return random.randint(0, 1)
 
-    def contribute(self) -> None:
-        self.blackboard.common_state["problems"] += random.randint(10, 20)
-        self.blackboard.common_state["suggestions"] += random.randint(10, 20)
-        self.blackboard.common_state["contributions"] += [self.__class__.__name__]
-        self.blackboard.common_state["progress"] += random.randint(10, 30)
+    def propose(self, rng) -> Delta:
+        return Delta(
+            {
+                "problems": rng.randint(10, 20),
+                "suggestions": rng.randint(10, 20),
+                "progress": rng.randint(10, 30),
+            },
+            [self.__class__.__name__],
+        )
 
 
 class Professor(AbstractExpert):
+    depends_on = ("problems",)
+    priority = 1
+
     @property
     def is_eager_to_contribute(self) -> bool:
         return True if self.blackboard.common_state["problems"] > 100 else False
 
-    def contribute(self) -> None:
-        self.blackboard.common_state["problems"] += random.randint(1, 2)
-        self.blackboard.common_state["suggestions"] += random.randint(10, 20)
+    def propose(self, rng) -> Delta:
+        return Delta(
+            {
+                "problems": rng.randint(1, 2),
+                "suggestions": rng.randint(10, 20),
+                "progress": rng.randint(10, 100),
+            },
+            [self.__class__.__name__],
+        )
+
+
+class AsyncAbstractExpert(metaclass=abc.ABCMeta):
+    """An expert whose eagerness check and contribution may wait on I/O."""
+
+    def __init__(self, blackboard: Blackboard) -> None:
+        self.blackboard = blackboard
+
+    @abc.abstractmethod
+    async def is_eager_to_contribute(self):
+        raise NotImplementedError("Must provide implementation in subclass.")
+
+    @abc.abstractmethod
+    async def contribute(self):
+        raise NotImplementedError("Must provide implementation in subclass.")
+
+
+class AsyncController:
+    """
+    Consults async experts concurrently on the running event loop.
+
+    Every round schedules all experts at once, but at most `concurrency`
+    of them check eagerness or contribute at the same time. As soon as the
+    progress reaches 100 the rest of the round is cancelled; `cancelled`
+    counts those tasks. An expert's exception cancels the round and is
+    raised from `run_loop`.
+    """
+
+    def __init__(self, blackboard: Blackboard, concurrency: int = 10) -> None:
+        self.blackboard = blackboard
+        self.concurrency = concurrency
+        self.cancelled = 0
+
+    async def run_loop(self):
+        state = self.blackboard.common_state
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def consult(expert) -> None:
+            async with semaphore:
+                if state["progress"] < 100 and await expert.is_eager_to_contribute():
+                    if state["progress"] < 100:
+                        await expert.contribute()
+
+        while state["progress"] < 100:
+            pending = {
+                asyncio.ensure_future(consult(expert))
+                for expert in self.blackboard.experts
+            }
+            try:
+                while pending and state["progress"] < 100:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        task.result()
+            finally:
+                for task in pending:
+                    task.cancel()
+                self.cancelled += len(pending)
+                await asyncio.gather(*pending, return_exceptions=True)
+        return state["contributions"]
+
+
+class Librarian(AsyncAbstractExpert):
+    def __init__(self, blackboard: Blackboard, lookup_time: float = 0.001) -> None:
+        super().__init__(blackboard)
+        self.lookup_time = lookup_time
+
+    async def is_eager_to_contribute(self) -> bool:
+        return True
+
+    async def contribute(self) -> None:
+        await asyncio.sleep(self.lookup_time)  # e.g. a query to a catalogue service
+        self.blackboard.common_state["suggestions"] += random.randint(1, 5)
         self.blackboard.common_state["contributions"] += [self.__class__.__name__]
-        self.blackboard.common_state["progress"] += random.randint(10, 100)
+        self.blackboard.common_state["progress"] += random.randint(5, 15)
 
 
 def main():
@@ -121,6 +746,80 @@ def main():
      'Student',
      'Scientist',
      'Professor']
+
+    # the agenda re-checks the professor only when "problems" changes
+    >>> blackboard = Blackboard()
+    >>> blackboard.add_expert(Student(blackboard))
+    >>> blackboard.add_expert(Professor(blackboard))
+    >>> controller = AgendaController(blackboard)
+    >>> contributions = controller.run_loop()
+    >>> contributions[-1], blackboard.common_state["progress"] >= 100
+    ('Professor', True)
+
+    # eager experts propose deltas in parallel, merged in a fixed order
+    >>> def parallel_run(seed):
+    ...     blackboard = Blackboard()
+    ...     blackboard.add_expert(Student(blackboard))
+    ...     blackboard.add_expert(Professor(blackboard))
+    ...     ParallelController(blackboard, max_workers=2, seed=seed).run_loop()
+    ...     return blackboard.common_state
+    >>> parallel_run(seed=7) == parallel_run(seed=7)
+    True
+
+    # a bounded log keeps only the latest contributions and per-expert counts
+    >>> log = ContributionLog(cap=3)
+    >>> log += ["Student", "Student", "Scientist", "Professor"]
+    >>> log.to_list(), log.last(2), log.total
+    (['Student', 'Scientist', 'Professor'], ['Scientist', 'Professor'], 4)
+    >>> log.counts()
+    {'Student': 2, 'Scientist': 1, 'Professor': 1}
+    >>> blackboard = Blackboard(contributions=ContributionLog(cap=1000))
+    >>> blackboard.add_expert(Student(blackboard))
+    >>> log = Controller(blackboard).run_loop()
+    >>> log.counts() == {"Student": len(log)}
+    True
+
+    # a run can be snapshotted every few contributions and resumed later
+    >>> import tempfile
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> path = os.path.join(directory.name, "run.ckpt")
+    >>> blackboard = Blackboard()
+    >>> blackboard.add_expert(Student(blackboard))
+    >>> with Checkpointer(path, every=10) as checkpointer:
+    ...     contributions = Controller(blackboard, checkpointer).run_loop()
+    >>> controller = Controller.resume(path)
+    >>> len(controller.blackboard.common_state["contributions"]) % 10
+    0
+    >>> controller.run_loop()[-1], controller.blackboard.common_state["progress"] >= 100
+    ('Student', True)
+    >>> directory.cleanup()
+
+    # per-expert timings, also delivered periodically to a callback
+    >>> blackboard = Blackboard()
+    >>> blackboard.add_expert(Student(blackboard))
+    >>> blackboard.add_expert(Professor(blackboard))
+    >>> reports = []
+    >>> profiler = ExpertProfiler(callback=reports.append, interval=0)
+    >>> contributions = Controller(blackboard, profiler=profiler).run_loop()
+    >>> report = profiler.report()
+    >>> [(row.name, row.contributions) for row in report.rows] == [
+    ...     ("Student", contributions.count("Student")),
+    ...     ("Professor", contributions.count("Professor")),
+    ... ]
+    True
+    >>> len(reports) == len(contributions)
+    True
+    >>> print(str(report).splitlines()[0])
+      # expert         checks   check s contribs contrib s progress/s
+
+    # async experts are consulted concurrently, at most five at a time
+    >>> blackboard = Blackboard()
+    >>> for _ in range(20):
+    ...     blackboard.add_expert(Librarian(blackboard))
+    >>> controller = AsyncController(blackboard, concurrency=5)
+    >>> contributions = asyncio.run(controller.run_loop())
+    >>> set(contributions), blackboard.common_state["progress"] >= 100
+    ({'Librarian'}, True)
     """
 
 
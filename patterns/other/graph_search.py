@@ -1,51 +1,156 @@
+import itertools
+import mmap
+import random
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heapify, heappop, heappush
+from math import inf
+from multiprocessing import shared_memory
+
+
 class GraphSearch:
 
     """Graph search emulation in python, from source
     http://www.python.org/doc/essays/graphs/
 
     dfs stands for Depth First Search
-    bfs stands for Breadth First Search"""
+    bfs stands for Breadth First Search
 
-    def __init__(self, graph):
+    `weights` - стоимость ребер для взвешенного поиска: словарь
+    `{(узел, сосед): стоимость}` или функция `weights(узел, сосед)`.
+    Без него каждое ребро стоит 1, если только сам граф не хранит веса
+    (см. `CompactGraph.from_dict`)."""
+
+    def __init__(self, graph, weights=None):
         self.graph = graph
+        self.weights = weights
+        self._reverse = None
+        self._trees = {}
+        self._weighted_edges = _edge_function(graph, weights)
+        self._reachability = None
+        self._reachability_stale = False
+        self._compact = None
+        self._landmarks = None
 
-    def find_path_dfs(self, start, end, path=None):
-        path = path or []
+    def find_path_dfs(self, start, end):
+        """
+        Находит путь между узлами обходом в глубину без рекурсии.
 
-        path.append(start)
+        Стек хранит итераторы по соседям, а множество `visited` заменяет
+        проверку `node not in path`: узел, из которого цель уже не нашлась,
+        повторно не обходится. Порядок обхода и найденный путь совпадают
+        с рекурсивной версией.
+        """
         if start == end:
-            return path
-        for node in self.graph.get(start, []):
-            if node not in path:
-                newpath = self.find_path_dfs(node, end, path[:])
-                if newpath:
-                    return newpath
-
-    def find_all_paths_dfs(self, start, end, path=None):
-        path = path or []
-        path.append(start)
+            return [start]
+        if self._unreachable(start, end):
+            return None
+        neighbors = self.graph.get
+        path = [start]
+        visited = {start}
+        stack = [iter(neighbors(start, ()))]
+        while stack:
+            for node in stack[-1]:
+                if node not in visited:
+                    visited.add(node)
+                    path.append(node)
+                    if node == end:
+                        return path
+                    stack.append(iter(neighbors(node, ())))
+                    break
+            else:
+                stack.pop()
+                path.pop()
+        return None
+
+    def find_all_paths_dfs(self, start, end):
+        return list(self.iter_all_paths(start, end))
+
+    def iter_all_paths(self, start, end, max_depth=None, max_paths=None):
+        """
+        Лениво перечисляет все простые пути от `start` до `end` в порядке
+        обхода в глубину.
+
+        - `max_depth`: наибольшее число ребер в пути, более длинные ветви не обходятся.
+        - `max_paths`: после стольких путей перечисление останавливается.
+
+        Все ветви обхода используют один общий стек пути, копия делается только
+        для найденного пути, поэтому память растет как O(глубины), а вызывающий
+        код может прекратить перечисление в любой момент.
+        """
+        if max_paths is not None and max_paths <= 0:
+            return
         if start == end:
-            return [path]
-        paths = []
-        for node in self.graph.get(start, []):
-            if node not in path:
-                newpaths = self.find_all_paths_dfs(node, end, path[:])
-                paths.extend(newpaths)
-        return paths
-
-    def find_shortest_path_dfs(self, start, end, path=None):
-        path = path or []
-        path.append(start)
+            yield [start]
+            return
+        if self._unreachable(start, end):
+            return
+        if max_depth is None:
+            max_depth = inf
+        neighbors = self.graph.get
+        path = [start]
+        on_path = {start}
+        stack = [iter(neighbors(start, ()))]
+        found = 0
+        while stack:
+            for node in stack[-1]:
+                if node in on_path:
+                    continue
+                if node == end:
+                    if len(path) <= max_depth:
+                        yield path + [node]
+                        found += 1
+                        if found == max_paths:
+                            return
+                elif len(path) < max_depth:
+                    path.append(node)
+                    on_path.add(node)
+                    stack.append(iter(neighbors(node, ())))
+                    break
+            else:
+                stack.pop()
+                on_path.discard(path.pop())
 
+    def find_shortest_path_dfs(self, start, end):
+        """
+        Находит кратчайший простой путь перебором в глубину без рекурсии.
+
+        Текущий путь хранится в одном списке, а ветви, которые не могут дать
+        путь строго короче уже найденного, отсекаются. При равной длине
+        возвращается первый путь в порядке обхода, как и раньше.
+        """
         if start == end:
-            return path
+            return [start]
+        if self._unreachable(start, end):
+            return None
+        neighbors = self.graph.get
+        path = [start]
+        on_path = {start}
+        stack = [iter(neighbors(start, ()))]
         shortest = None
-        for node in self.graph.get(start, []):
-            if node not in path:
-                newpath = self.find_shortest_path_dfs(node, end, path[:])
-                if newpath:
-                    if not shortest or len(newpath) < len(shortest):
-                        shortest = newpath
+        while stack:
+            descended = False
+            for node in stack[-1]:
+                if node in on_path:
+                    continue
+                if node == end:
+                    # соседи того же узла не дадут пути короче этого
+                    shortest = path + [node]
+                    break
+                if shortest is None or len(path) + 2 < len(shortest):
+                    path.append(node)
+                    on_path.add(node)
+                    stack.append(iter(neighbors(node, ())))
+                    descended = True
+                    break
+            if not descended:
+                stack.pop()
+                on_path.discard(path.pop())
         return shortest
 
     def find_shortest_path_bfs(self, start, end):
@@ -55,35 +160,1419 @@ class GraphSearch:
         - `start`: Узел, с которого начинается поиск.
         - `end`: Узел, до которого нужно найти кратчайший путь.
 
-        Функция возвращает два значения:
-        - `queue_path_to_end`: Список узлов, представляющих кратчайший путь от `start` до `end`.
-        - `dist_to[end]`: Словарь, сопоставляющий каждый узел в графе (кроме `start`)
-        с его расстоянием от него (в терминах количества переходов).
+        Очередь построена на `collections.deque`, для каждого узла запоминается
+        только его предок, а путь восстанавливается один раз, когда `end`
+        обнаружен.
+
+        Если пути между `start` и `end` не существует, функция вернет `None`.
+        """
+        if start == end:
+            return [start]
+        if self._unreachable(start, end):
+            return None
+        neighbors = self.graph.get
+        edge_to = {start: None}
+        queue = deque([start])
+        while queue:
+            value = queue.popleft()
+            for node in neighbors(value, ()):
+                if node not in edge_to:
+                    edge_to[node] = value
+                    if node == end:
+                        return _build_path(edge_to, end)
+                    queue.append(node)
+        return None
+
+    def find_shortest_path_bidirectional(self, start, end):
+        """
+        Двунаправленный поиск в ширину: уровни поочередно раскрываются от `start`
+        по прямым ребрам и от `end` по обратным, всегда со стороны меньшего
+        фронта. Для поиска между двумя узлами большого графа это обходит
+        примерно квадратный корень от числа узлов, которое обошел бы обычный
+        BFS.
+
+        Длина пути совпадает с `find_shortest_path_bfs`, но среди нескольких
+        кратчайших путей может быть выбран другой.
+        """
+        if start == end:
+            return [start]
+        if self._unreachable(start, end):
+            return None
+        forward, backward = self.graph.get, self._reverse_graph().get
+        forward_parent, backward_parent = {start: None}, {end: None}
+        forward_dist, backward_dist = {start: 0}, {end: 0}
+        forward_frontier, backward_frontier = [start], [end]
+        while forward_frontier and backward_frontier:
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier, meeting = _expand_level(
+                    forward_frontier,
+                    forward,
+                    forward_parent,
+                    forward_dist,
+                    backward_dist,
+                )
+            else:
+                backward_frontier, meeting = _expand_level(
+                    backward_frontier,
+                    backward,
+                    backward_parent,
+                    backward_dist,
+                    forward_dist,
+                )
+            if meeting is not None:
+                path = _build_path(forward_parent, meeting)
+                node = backward_parent[meeting]
+                while node is not None:
+                    path.append(node)
+                    node = backward_parent[node]
+                return path
+        return None
+
+    def find_shortest_path_dijkstra(self, start, end):
+        """
+        Находит путь минимальной стоимости алгоритмом Дейкстры на куче.
+        Поиск останавливается, как только `end` извлечен из кучи. Если для
+        `start` уже построено дерево кратчайших путей, ответ берется из него.
+        """
+        tree = self._trees.get(start)
+        if tree is not None:
+            return tree.path_to(end)
+        return self.find_shortest_path_astar(start, end)
+
+    def find_shortest_path_astar(self, start, end, heuristic=None):
+        """
+        Находит путь минимальной стоимости алгоритмом A*.
+
+        `heuristic(node, end)` - нижняя оценка стоимости пути от `node` до
+        `end`; она не должна переоценивать настоящую стоимость, иначе путь
+        может оказаться не самым дешевым. Без эвристики используются оценки
+        ориентиров (ALT), если они построены `build_landmarks`, иначе это
+        алгоритм Дейкстры.
+        """
+        if start == end:
+            return [start]
+        if self._unreachable(start, end):
+            return None
+        if heuristic is None and self._landmarks is not None:
+            heuristic = self._landmarks.heuristic(end)
+            if heuristic(start, end) == inf:
+                return None
+        edges = self._weighted_edges
+        dist = {start: 0}
+        edge_to = {start: None}
+        counter = itertools.count()
+        priority = 0 if heuristic is None else heuristic(start, end)
+        heap = [(priority, next(counter), 0, start)]
+        while heap:
+            _, _, cost, value = heappop(heap)
+            if value == end:
+                return _build_path(edge_to, end)
+            if cost > dist[value]:
+                continue
+            for node, weight in edges(value):
+                if weight < 0:
+                    raise ValueError(f"negative edge weight {value!r} -> {node!r}")
+                new_cost = cost + weight
+                if new_cost < dist.get(node, inf):
+                    dist[node] = new_cost
+                    edge_to[node] = value
+                    if heuristic is not None:
+                        priority = new_cost + heuristic(node, end)
+                    else:
+                        priority = new_cost
+                    if priority < inf:
+                        heappush(heap, (priority, next(counter), new_cost, node))
+        return None
+
+    def shortest_path_tree(self, source):
+        """
+        Строит (или берет из кэша) дерево кратчайших путей от `source` до всех
+        достижимых узлов. Одно дерево отвечает на любые запросы из `source`
+        без повторного поиска.
+        """
+        tree = self._trees.get(source)
+        if tree is None:
+            dist, edge_to = _dijkstra(self._weighted_edges, source)
+            tree = self._trees[source] = ShortestPathTree(source, dist, edge_to)
+        return tree
+
+    def path_cost(self, path):
+        """Возвращает стоимость пути, для параллельных ребер берется самое дешевое."""
+        edges = self._weighted_edges
+        return sum(
+            _edge_weight(edges, value, next_value)
+            for value, next_value in zip(path, path[1:])
+        )
+
+    def iter_shortest_paths(self, start, end, max_paths=None):
+        """
+        Лениво перечисляет простые пути от `start` до `end` по возрастанию
+        стоимости (алгоритм Йена).
+
+        Один проход Дейкстры по обратному графу от `end` дает точные
+        расстояния до `end`: по ним сразу восстанавливается первый путь,
+        и они служат эвристикой A* для поиска ответвлений, которая остается
+        допустимой при запрете узлов и ребер. Ответвления ищутся только
+        от узла, где путь отошел от родительского (модификация Лоулера),
+        поэтому каждый следующий путь стоит нескольких коротких поисков,
+        а не перебора всех путей.
+        """
+        if max_paths is not None and max_paths <= 0:
+            return
+        if start == end:
+            yield [start]
+            return
+        if self._unreachable(start, end):
+            return
+        remaining, successor = _dijkstra(self._reverse_weighted_edges(), end)
+        if start not in remaining:
+            return
+        edges = self._weighted_edges
+        path = _build_path(successor, start)
+        path.reverse()
+        candidates = [(remaining[start], 0, path, 0)]
+        counter = itertools.count(1)
+        seen = {tuple(path)}
+        # продолжения уже выданных путей после каждого их префикса
+        branches = {}
+        found = 0
+        while candidates:
+            _, _, path, deviation = heappop(candidates)
+            yield path
+            found += 1
+            if found == max_paths:
+                return
+            for index in range(len(path) - 1):
+                branches.setdefault(tuple(path[: index + 1]), set()).add(
+                    path[index + 1]
+                )
+            stop = deviation + 1
+            root_cost = sum(
+                _edge_weight(edges, value, next_value)
+                for value, next_value in zip(path, path[1:stop])
+            )
+            for index in range(deviation, len(path) - 1):
+                spur_node = path[index]
+                blocked = set(path[:index])
+                banned = branches[tuple(path[: index + 1])]
+                spur = _restricted_astar(
+                    edges, spur_node, end, remaining, successor, blocked, banned
+                )
+                if spur is not None:
+                    spur_cost, spur_path = spur
+                    candidate = path[:index] + spur_path
+                    key = tuple(candidate)
+                    if key not in seen:
+                        seen.add(key)
+                        heappush(
+                            candidates,
+                            (root_cost + spur_cost, next(counter), candidate, index),
+                        )
+                root_cost += _edge_weight(edges, spur_node, path[index + 1])
+
+    def as_compact(self):
+        """Возвращает граф в форме `CompactGraph`, при необходимости строит и кэширует ее."""
+        if isinstance(self.graph, CompactGraph):
+            return self.graph
+        if self._compact is None:
+            self._compact = CompactGraph.from_dict(self.graph)
+        return self._compact
+
+    def find_paths_batch(self, pairs, max_workers=None, chunksize=4096):
+        """
+        Находит кратчайшие по числу ребер пути для пачки пар `(start, end)`,
+        результаты возвращаются в порядке входных пар; каждый совпадает
+        с `find_shortest_path_bfs`.
+
+        Массивы CSR один раз копируются в `multiprocessing.shared_memory`,
+        и процессы пула подключаются к ним без копирования и сериализации
+        графа. Задачи и ответы передаются пачками по `chunksize` пар в виде
+        целочисленных идентификаторов, метки восстанавливаются в текущем
+        процессе. Пары, которые отсекает индекс достижимости, в пул не
+        передаются. При `max_workers=1` поиск идет в текущем процессе.
+        """
+        compact = self.as_compact()
+        results = [None] * len(pairs)
+        queries = array("q")
+        positions = []
+        for position, (start, end) in enumerate(pairs):
+            if start == end:
+                results[position] = [start]
+                continue
+            start_id, end_id = compact.node_id(start), compact.node_id(end)
+            if start_id is None or end_id is None or self._unreachable(start, end):
+                continue
+            queries.append(start_id)
+            queries.append(end_id)
+            positions.append(position)
+        step = 2 * chunksize
+        chunks = []
+        for offset in range(0, len(queries), step):
+            stop = offset + step
+            chunks.append(queries[offset:stop])
+        if max_workers == 1 or not chunks:
+            found = _csr_shortest_paths(compact.offsets, compact.targets, queries)
+        else:
+            found = _shared_memory_batch(compact, chunks, max_workers)
+        labels = compact.labels
+        for position, path in zip(positions, found):
+            if path is not None:
+                results[position] = [labels[node_id] for node_id in path]
+        return results
+
+    def multi_source_bfs(self, sources, max_depth=None):
+        """
+        Считает число ребер от каждого из `sources` до всех узлов одним общим
+        обходом в ширину по `as_compact()`.
+
+        Фронт хранится как битовые маски: у каждого узла фронта целое число,
+        где бит `i` означает, что узел достигнут от `sources[i]` на текущем
+        уровне. Ребро обрабатывается один раз за уровень сразу для всех
+        источников побитовым ИЛИ, а не отдельно для каждого источника, как
+        при тысяче вызовов `find_shortest_path_bfs`.
+
+        Расстояния тоже копятся без цикла по источникам, в битовых плоскостях:
+        плоскость `k` узла - маска источников, у расстояния от которых до узла
+        установлен бит `k`. В конце каждая плоскость раскладывается по байтам
+        в целое число с 32-битной дорожкой на источник, так что строка
+        расстояний узла собирается за несколько операций над целыми.
+
+        Возвращает по массиву `array('i')` на источник в порядке `sources`:
+        индекс - идентификатор узла в `as_compact()`, значение - расстояние
+        или -1, если узел недостижим (или дальше `max_depth`).
+        """
+        count = len(sources)
+        compact = self.as_compact()
+        offsets, targets = compact.offsets, compact.targets
+        seen = [0] * len(compact)
+        planes = []
+        frontier = {}
+        for bit, source in enumerate(sources):
+            node_id = compact.node_id(source)
+            if node_id is not None:
+                seen[node_id] |= 1 << bit
+                frontier[node_id] = seen[node_id]
+        if max_depth is None:
+            max_depth = inf
+        level = 0
+        while frontier and level < max_depth:
+            level += 1
+            if level == 1 << len(planes):
+                planes.append([0] * len(compact))
+            level_planes = [
+                plane for index, plane in enumerate(planes) if level >> index & 1
+            ]
+            reached = {}
+            for node_id, mask in frontier.items():
+                start, stop = offsets[node_id], offsets[node_id + 1]
+                for target in targets[start:stop]:
+                    reached[target] = reached.get(target, 0) | mask
+            frontier = {}
+            for node_id, mask in reached.items():
+                mask &= ~seen[node_id]
+                if mask:
+                    seen[node_id] |= mask
+                    frontier[node_id] = mask
+                    for plane in level_planes:
+                        plane[node_id] |= mask
+        everyone = (1 << count) - 1
+        width = count * _LANE_BYTES
+        data = bytearray()
+        for node_id, mask in enumerate(seen):
+            column = _spread_lanes(everyone & ~mask, count) * _LANE_MAX
+            for index, plane in enumerate(planes):
+                if plane[node_id]:
+                    column += _spread_lanes(plane[node_id], count) << index
+            data += column.to_bytes(width, "little")
+        matrix = array("i")
+        matrix.frombytes(data)
+        if sys.byteorder == "big":
+            matrix.byteswap()
+        # строка узла - расстояния от всех источников, столбец - срез с шагом
+        return [matrix[bit::count] for bit in range(count)]
+
+    def build_reachability_index(self, bitset_limit=20000):
+        """
+        Строит индекс достижимости, после чего все методы `find_*` отвечают
+        на запросы к недостижимым узлам без обхода графа.
+        """
+        self._reachability = ReachabilityIndex(self.graph, bitset_limit)
+        self._reachability_stale = False
+        return self._reachability
+
+    def _unreachable(self, start, end):
+        reachability = self._reachability
+        if reachability is None:
+            return False
+        if self._reachability_stale:
+            reachability = self.build_reachability_index(reachability.bitset_limit)
+        return not reachability.maybe_reachable(start, end)
+
+    def build_landmarks(self, k=8, seed=None):
+        """
+        Выбирает `k` ориентиров и запоминает кратчайшие расстояния от каждого
+        ориентира до всех узлов и от всех узлов до него. После этого A* и
+        Дейкстра используют нижние оценки ALT, а `LandmarkIndex.upper_bound`
+        дает приближенное расстояние без поиска. Время построения и занятая
+        память - в `LandmarkIndex.stats`.
+        """
+        self._landmarks = LandmarkIndex(self, k, seed)
+        return self._landmarks
 
-        Если пути между `start` и `end` не существует, функция вернет пустой список и пустой словарь.
+    def add_edge(self, start, end, weight=None):
         """
-        queue = [start]
-        dist_to = {start: 0}
-        edge_to = {}
+        Добавляет ребро `start -> end` и поддерживает кэши в актуальном состоянии.
+
+        Деревья кратчайших путей и расстояния ориентиров могут только
+        уменьшиться, поэтому они исправляются продолжением Дейкстры от `end`
+        и только там, где новое ребро дает путь короче. Индекс достижимости
+        не меняется, если `end` уже был достижим из `start`, и дополняется
+        на месте, если нумерация компонент остается топологической; иначе
+        он будет перестроен при следующем запросе.
+
+        `weight` обязателен, если веса ребер заданы словарем, и недопустим
+        в остальных случаях. Словарь хранит один вес на пару узлов, поэтому
+        новый вес относится и к уже существующим параллельным ребрам.
+        """
+        self._check_mutable()
+        old_cost = None
+        if self.weights is not None and not callable(self.weights):
+            if weight is None:
+                raise ValueError("weight is required when weights are a mapping")
+            if end in self.graph.get(start, ()):
+                old_cost = self.weights[start, end]
+            self.weights[start, end] = weight
+        elif weight is not None:
+            raise TypeError("edge weights can only be stored in a weights mapping")
+        self.graph.setdefault(start, []).append(end)
+        if self._reverse is not None:
+            self._reverse.setdefault(end, []).append(start)
+        self._compact = None
+        cost = self._edge_cost(start, end)
+        edges = self._weighted_edges
+        for tree in self._trees.values():
+            _repair_after_insert(tree.dist, tree.edge_to, edges, start, end, cost)
+        if self._landmarks is not None:
+            self._landmarks.add_edge(
+                start, end, cost, edges, self._reverse_weighted_edges()
+            )
+        if old_cost is not None and old_cost < cost:
+            # существующие параллельные ребра подорожали
+            self._repair_after_removal(start, end, old_cost)
+        if self._reachability is not None and not self._reachability_stale:
+            self._reachability_stale = not self._reachability.add_edge(start, end)
+
+    def remove_edge(self, start, end):
+        """
+        Удаляет одно ребро `start -> end`.
+
+        Если ребро не лежит ни на одном кратчайшем пути дерева (не "тугое"),
+        дерево не меняется. Иначе пересчитываются только узлы, до которых
+        из `end` можно дойти по тугим ребрам: их расстояния берутся от
+        незатронутых соседей и уточняются Дейкстрой. Так же исправляются
+        расстояния ориентиров. Индекс достижимости перестраивается при
+        следующем запросе, если это было последнее ребро между узлами.
+        """
+        self._check_mutable()
+        neighbors = self.graph.get(start)
+        if neighbors is None or end not in neighbors:
+            raise KeyError((start, end))
+        cost = self._edge_cost(start, end)
+        neighbors.remove(end)
+        if self._reverse is not None:
+            self._reverse[end].remove(start)
+        weights = self.weights
+        if end not in neighbors and weights is not None and not callable(weights):
+            del weights[start, end]
+        self._compact = None
+        self._repair_after_removal(start, end, cost)
+        if self._reachability is not None and end not in neighbors:
+            self._reachability_stale = True
+
+    def _repair_after_removal(self, start, end, cost):
+        edges, reverse_edges = self._weighted_edges, self._reverse_weighted_edges()
+        for tree in self._trees.values():
+            _repair_after_delete(
+                tree.dist,
+                tree.edge_to,
+                edges,
+                reverse_edges,
+                tree.source,
+                start,
+                end,
+                cost,
+            )
+        if self._landmarks is not None:
+            self._landmarks.remove_edge(start, end, cost, edges, reverse_edges)
+
+    def _check_mutable(self):
+        if isinstance(self.graph, CompactGraph):
+            raise TypeError("CompactGraph is immutable, update the source dict instead")
+
+    def _edge_cost(self, start, end):
+        weights = self.weights
+        if weights is None:
+            return 1
+        if callable(weights):
+            return weights(start, end)
+        return weights[start, end]
+
+    def _reverse_weighted_edges(self):
+        weights = self.weights
+        if callable(weights):
+            return _edge_function(
+                self._reverse_graph(), lambda node, neighbor: weights(neighbor, node)
+            )
+        if weights is not None:
+            return _edge_function(
+                self._reverse_graph(), lambda node, neighbor: weights[neighbor, node]
+            )
+        return _edge_function(self._reverse_graph(), None)
+
+    def _reverse_graph(self):
+        if self._reverse is None:
+            if isinstance(self.graph, CompactGraph):
+                self._reverse = self.graph.reversed()
+            else:
+                reverse = {}
+                for node, neighbors in self.graph.items():
+                    for neighbor in neighbors:
+                        reverse.setdefault(neighbor, []).append(node)
+                self._reverse = reverse
+        return self._reverse
+
+
+_LANE_BYTES = array("i").itemsize
+_LANE_MAX = (1 << 8 * _LANE_BYTES) - 1
+# байт маски -> восемь дорожек `array('i')` со значениями 0 или 1
+_LANE_BITS = [
+    b"".join((byte >> bit & 1).to_bytes(_LANE_BYTES, "little") for bit in range(8))
+    for byte in range(256)
+]
+
+
+def _spread_lanes(mask, count):
+    """Раскладывает биты `mask` по дорожкам: бит `i` становится 1 в дорожке `i`."""
+    lanes = map(_LANE_BITS.__getitem__, mask.to_bytes((count + 7) // 8, "little"))
+    return int.from_bytes(b"".join(lanes), "little")
+
+
+def _dijkstra(edges, source):
+    """Дейкстра от `source` по всему графу: стоимости и предки достижимых узлов."""
+    dist = {source: 0}
+    edge_to = {source: None}
+    counter = itertools.count()
+    heap = [(0, next(counter), source)]
+    while heap:
+        cost, _, value = heappop(heap)
+        if cost > dist[value]:
+            continue
+        for node, weight in edges(value):
+            if weight < 0:
+                raise ValueError(f"negative edge weight {value!r} -> {node!r}")
+            new_cost = cost + weight
+            if new_cost < dist.get(node, inf):
+                dist[node] = new_cost
+                edge_to[node] = value
+                heappush(heap, (new_cost, next(counter), node))
+    return dist, edge_to
+
+
+def _edge_weight(edges, start, end):
+    """Стоимость самого дешевого из параллельных ребер `start -> end`."""
+    return min(weight for node, weight in edges(start) if node == end)
+
+
+def _restricted_astar(edges, source, end, remaining, successor, blocked, banned):
+    """
+    A* от `source` до `end` в обход узлов `blocked` и без ребер из `source`
+    в узлы `banned`. `remaining` - точные расстояния до `end` в полном графе,
+    `successor` - следующий узел на таком кратчайшем пути.
+
+    Эвристика точная, поэтому как только из извлеченного узла кратчайший
+    путь полного графа не задевает запреты, он и есть ответ, и поиск
+    заканчивается без обхода равных по стоимости узлов.
+    """
+    dist = {source: 0}
+    edge_to = {source: None}
+    counter = itertools.count()
+    heap = [(remaining[source], next(counter), 0, source)]
+    while heap:
+        _, _, cost, value = heappop(heap)
+        if cost > dist[value]:
+            continue
+        tail = _free_tail(successor, value, blocked)
+        if tail is not None and (value != source or tail[0] not in banned):
+            path = _build_path(edge_to, value)
+            if set(path).isdisjoint(tail):
+                return cost + remaining[value], path + tail
+        for node, weight in edges(value):
+            if node in blocked or value == source and node in banned:
+                continue
+            estimate = remaining.get(node, inf)
+            new_cost = cost + weight
+            if estimate < inf and new_cost < dist.get(node, inf):
+                dist[node] = new_cost
+                edge_to[node] = value
+                heappush(heap, (new_cost + estimate, next(counter), new_cost, node))
+    return None
+
+
+def _free_tail(successor, node, excluded):
+    """Кратчайший путь полного графа от `node` до цели без самого `node`, если он обходит `excluded`."""
+    tail = []
+    node = successor[node]
+    while node is not None:
+        if node in excluded:
+            return None
+        tail.append(node)
+        node = successor[node]
+    return tail
+
+
+def _repair_after_insert(dist, edge_to, edges, start, end, weight):
+    """Исправляет расстояния после добавления ребра `start -> end`."""
+    cost = dist.get(start, inf) + weight
+    if cost < dist.get(end, inf):
+        dist[end] = cost
+        if edge_to is not None:
+            edge_to[end] = start
+        _propagate(dist, edge_to, edges, [(cost, end)])
+
+
+def _repair_after_delete(
+    dist, edge_to, edges, reverse_edges, source, start, end, weight
+):
+    """
+    Исправляет расстояния после удаления ребра `start -> end` (оно уже удалено
+    из графа). Затронуты только узлы, достижимые из `end` по тугим ребрам,
+    т.е. ребрам, для которых `dist[x] + w == dist[y]`.
+    """
+    start_cost = dist.get(start, inf)
+    if start_cost == inf or start_cost + weight != dist.get(end, inf) or end == source:
+        return
+    affected = {end}
+    stack = [end]
+    while stack:
+        value = stack.pop()
+        cost = dist.get(value, inf)
+        for node, node_weight in edges(value):
+            if (
+                node not in affected
+                and node != source
+                and cost + node_weight == dist.get(node, inf)
+            ):
+                affected.add(node)
+                stack.append(node)
+    for node in affected:
+        dist.pop(node, None)
+        if edge_to is not None:
+            edge_to.pop(node, None)
+    seeds = []
+    for node in affected:
+        best, via = inf, None
+        for previous, previous_weight in reverse_edges(node):
+            cost = dist.get(previous, inf) + previous_weight
+            if cost < best:
+                best, via = cost, previous
+        if best < inf:
+            dist[node] = best
+            if edge_to is not None:
+                edge_to[node] = via
+            seeds.append((best, node))
+    _propagate(dist, edge_to, edges, seeds)
+
+
+def _propagate(dist, edge_to, edges, seeds):
+    """Продолжает Дейкстру от узлов `seeds`, чьи расстояния уже записаны в `dist`."""
+    counter = itertools.count()
+    heap = [(cost, next(counter), node) for cost, node in seeds]
+    heapify(heap)
+    while heap:
+        cost, _, value = heappop(heap)
+        if cost > dist.get(value, inf):
+            continue
+        for node, weight in edges(value):
+            new_cost = cost + weight
+            if new_cost < dist.get(node, inf):
+                dist[node] = new_cost
+                if edge_to is not None:
+                    edge_to[node] = value
+                heappush(heap, (new_cost, next(counter), node))
+
+
+class ShortestPathTree:
+    """Дерево кратчайших путей от `source`: стоимости и предки всех достижимых узлов."""
+
+    def __init__(self, source, dist, edge_to):
+        self.source = source
+        self.dist = dist
+        self.edge_to = edge_to
+
+    def distance_to(self, node):
+        return self.dist.get(node)
+
+    def path_to(self, node):
+        if node not in self.edge_to:
+            return None
+        return _build_path(self.edge_to, node)
+
+    def __contains__(self, node):
+        return node in self.dist
+
+
+class LandmarkIndex:
+    """
+    Оракул расстояний на ориентирах (landmarks, ALT).
+
+    Для каждого ориентира `L` хранятся массивы `d(L, v)` и `d(v, L)` по
+    идентификаторам `GraphSearch.as_compact()`. Из неравенства треугольника
+
+        d(u, t) >= d(L, t) - d(L, u)  и  d(u, t) >= d(u, L) - d(t, L),
+
+    а максимум по ориентирам - допустимая и согласованная эвристика для A*.
+    Сумма `d(u, L) + d(L, t)` - верхняя оценка, т.е. приближенное расстояние.
+
+    Ориентиры выбираются жадно: первый случайно, каждый следующий - узел,
+    самый далекий от уже выбранных (недостижимые узлы берутся в первую
+    очередь, чтобы покрыть все компоненты).
+    """
+
+    def __init__(self, graph_search, k=8, seed=None):
+        started = time.perf_counter()
+        compact = graph_search.as_compact()
+        self._compact_id = compact.node_id
+        # узлы, добавленные в граф после построения индекса
+        self._extra = {}
+        node_count = len(compact)
+        forward_edges = graph_search._weighted_edges
+        backward_edges = graph_search._reverse_weighted_edges()
+        self.landmarks = []
+        self.distances_from = []
+        self.distances_to = []
+        nearest = array("d", [inf]) * node_count
+        rng = random.Random(seed)
+        candidate = rng.randrange(node_count) if node_count else None
+        while candidate is not None and len(self.landmarks) < k:
+            landmark = compact.labels[candidate]
+            self.landmarks.append(landmark)
+            self.distances_from.append(
+                self._distances(forward_edges, landmark, node_count)
+            )
+            self.distances_to.append(
+                self._distances(backward_edges, landmark, node_count)
+            )
+            distances = self.distances_from[-1]
+            for node_id in range(node_count):
+                if distances[node_id] < nearest[node_id]:
+                    nearest[node_id] = distances[node_id]
+            farthest = max(range(node_count), key=nearest.__getitem__)
+            candidate = farthest if nearest[farthest] > 0 else None
+        self.stats = {
+            "landmarks": len(self.landmarks),
+            "seconds": time.perf_counter() - started,
+            "bytes": sum(
+                distances.itemsize * len(distances)
+                for distances in self.distances_from + self.distances_to
+            ),
+        }
+
+    def _slot(self, node):
+        node_id = self._compact_id(node)
+        return self._extra.get(node) if node_id is None else node_id
+
+    def _add_node(self, node):
+        if self._slot(node) is None:
+            self._extra[node] = len(self.distances_from[0]) if self.landmarks else 0
+            for distances in self.distances_from + self.distances_to:
+                distances.append(inf)
+
+    def add_edge(self, start, end, weight, edges, reverse_edges):
+        self._add_node(start)
+        self._add_node(end)
+        for frm, to in zip(self.distances_from, self.distances_to):
+            _repair_after_insert(
+                _SlotDistances(self, frm), None, edges, start, end, weight
+            )
+            _repair_after_insert(
+                _SlotDistances(self, to), None, reverse_edges, end, start, weight
+            )
+
+    def remove_edge(self, start, end, weight, edges, reverse_edges):
+        for landmark, frm, to in zip(
+            self.landmarks, self.distances_from, self.distances_to
+        ):
+            _repair_after_delete(
+                _SlotDistances(self, frm),
+                None,
+                edges,
+                reverse_edges,
+                landmark,
+                start,
+                end,
+                weight,
+            )
+            _repair_after_delete(
+                _SlotDistances(self, to),
+                None,
+                reverse_edges,
+                edges,
+                landmark,
+                end,
+                start,
+                weight,
+            )
+
+    def _distances(self, edges, landmark, node_count):
+        distances = array("d", [inf]) * node_count
+        slot = self._slot
+        for node, cost in _dijkstra(edges, landmark)[0].items():
+            distances[slot(node)] = cost
+        return distances
+
+    def lower_bound(self, start, end):
+        """Нижняя оценка `d(start, end)`; `inf` означает, что пути точно нет."""
+        return self.heuristic(end)(start, end)
+
+    def upper_bound(self, start, end):
+        """Длина кратчайшего пути через лучший ориентир, `inf` - если такого нет."""
+        source, target = self._slot(start), self._slot(end)
+        if source is None or target is None:
+            return 0 if start == end else inf
+        return min(
+            (
+                to[source] + frm[target]
+                for frm, to in zip(self.distances_from, self.distances_to)
+            ),
+            default=inf,
+        )
+
+    def heuristic(self, end):
+        """Эвристика ALT для A* к узлу `end`; значения для цели вычисляются один раз."""
+        target = self._slot(end)
+        if target is None:
+            return lambda node, end: 0
+        bounds = [
+            (frm, to, frm[target], to[target])
+            for frm, to in zip(self.distances_from, self.distances_to)
+        ]
+        slot = self._slot
+
+        def alt(node, end):
+            source = slot(node)
+            if source is None:
+                return 0
+            best = 0
+            for frm, to, frm_target, to_target in bounds:
+                frm_source, to_source = frm[source], to[source]
+                if frm_source < inf:
+                    if frm_target == inf:
+                        return inf  # L достигает node, но не end
+                    best = max(best, frm_target - frm_source)
+                if to_target < inf:
+                    if to_source == inf:
+                        return inf  # end достигает L, а node - нет
+                    best = max(best, to_source - to_target)
+            return best
 
+        return alt
+
+
+class _SlotDistances:
+    """Словарный доступ к массиву расстояний ориентира по меткам узлов."""
+
+    def __init__(self, index, distances):
+        self._slot = index._slot
+        self._distances = distances
+
+    def get(self, node, default=inf):
+        slot = self._slot(node)
+        return default if slot is None else self._distances[slot]
+
+    def __setitem__(self, node, cost):
+        self._distances[self._slot(node)] = cost
+
+    def pop(self, node, default=None):
+        self._distances[self._slot(node)] = inf
+
+
+class ReachabilityIndex:
+    """
+    Индекс достижимости на основе сильно связных компонент.
+
+    Компоненты находятся итеративным алгоритмом Тарьяна; граф компонент
+    (конденсация) ацикличен, и Тарьян нумерует компоненты в обратном
+    топологическом порядке, т.е. номер компоненты - это ее номер в
+    post-order обхода конденсации. Отсюда интервальная метка
+    `low[c] <= c`: все компоненты, достижимые из `c`, лежат в
+    `[low[c], c]`. Если номер цели выпадает из интервала, ответ "нет"
+    получается за O(1).
+
+    Интервал может ошибаться только в сторону "возможно". Если компонент не
+    больше `bitset_limit`, для каждой компоненты дополнительно хранится
+    битовое множество достижимых компонент, и проверка становится точной;
+    иначе точный ответ `reachable` дает обход конденсации, отсеченный
+    интервалами.
+    """
+
+    def __init__(self, graph, bitset_limit=20000):
+        self.bitset_limit = bitset_limit
+        if isinstance(graph, CompactGraph):
+            self._key = graph.node_id
+            nodes = range(len(graph))
+            neighbors = graph.neighbor_ids
+        else:
+            self._key = None
+            nodes = graph
+            neighbors = lambda node: graph.get(node, ())
+        component, successors = _strongly_connected_components(nodes, neighbors)
+        self.component = component
+        self.successors = successors
+        self.low = array("i", range(len(successors)))
+        low = self.low
+        for comp, succ in enumerate(successors):
+            for other in succ:
+                if low[other] < low[comp]:
+                    low[comp] = low[other]
+        self.bitsets = None
+        if len(successors) <= bitset_limit:
+            reach = []
+            for comp, succ in enumerate(successors):
+                bits = 1 << comp
+                for other in succ:
+                    bits |= reach[other]
+                reach.append(bits)
+            self.bitsets = [
+                bits.to_bytes((bits.bit_length() + 7) // 8, "little") for bits in reach
+            ]
+
+    @property
+    def component_count(self):
+        return len(self.successors)
+
+    def _component_of(self, node):
+        if self._key is None:
+            return self.component.get(node)
+        node_id = self._key(node)
+        return None if node_id is None else self.component[node_id]
+
+    def maybe_reachable(self, start, end):
+        """Ответ за O(1): `False` всегда точен, `True` точен при наличии битовых множеств."""
         if start == end:
-            return queue
+            return True
+        source, target = self._component_of(start), self._component_of(end)
+        if source is None or target is None:
+            return False
+        if source == target:
+            return True
+        if not self.low[source] <= target < source:
+            return False
+        if self.bitsets is None:
+            return True
+        row = self.bitsets[source]
+        byte = target >> 3
+        return byte < len(row) and bool(row[byte] >> (target & 7) & 1)
+
+    def add_edge(self, start, end):
+        """
+        Учитывает новое ребро; возвращает `False`, если индекс нужно перестроить.
+        На месте обрабатывается ребро в компоненту с меньшим номером, когда
+        есть битовые множества: конденсация остается ациклической, а
+        нумерация - обратной топологической.
+        """
+        if self.reachable(start, end):
+            return True
+        source, target = self._component_of(start), self._component_of(end)
+        if source is None or target is None or self.bitsets is None or target > source:
+            return False
+        self.successors[source] += (target,)
+        target_bits = int.from_bytes(self.bitsets[target], "little")
+        byte, bit = source >> 3, 1 << (source & 7)
+        for comp, row in enumerate(self.bitsets):
+            if byte < len(row) and row[byte] & bit:
+                bits = int.from_bytes(row, "little") | target_bits
+                self.bitsets[comp] = bits.to_bytes(
+                    (bits.bit_length() + 7) // 8, "little"
+                )
+                if self.low[target] < self.low[comp]:
+                    self.low[comp] = self.low[target]
+        return True
+
+    def reachable(self, start, end):
+        if not self.maybe_reachable(start, end):
+            return False
+        source, target = self._component_of(start), self._component_of(end)
+        if self.bitsets is not None or source == target:
+            return True
+        low, successors = self.low, self.successors
+        seen = {source}
+        stack = [source]
+        while stack:
+            for other in successors[stack.pop()]:
+                if other == target:
+                    return True
+                if other not in seen and low[other] <= target < other:
+                    seen.add(other)
+                    stack.append(other)
+        return False
+
+
+def _strongly_connected_components(nodes, neighbors):
+    """
+    Итеративный алгоритм Тарьяна. Возвращает словарь `узел -> компонента` и
+    для каждой компоненты кортеж компонент, в которые из нее ведут ребра.
+    """
+    index, lowlink = {}, {}
+    on_stack = set()
+    stack = []
+    component = {}
+    successors = []
+    counter = itertools.count()
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = next(counter)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(neighbors(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = next(counter)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(neighbors(child))))
+                    break
+                if child in on_stack and index[child] < lowlink[node]:
+                    lowlink[node] = index[child]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    comp = len(successors)
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component[member] = comp
+                        members.append(member)
+                        if member == node:
+                            break
+                    succ = set()
+                    for member in members:
+                        for child in neighbors(member):
+                            if component[child] != comp:
+                                succ.add(component[child])
+                    successors.append(tuple(succ))
+    return component, successors
+
+
+# граф в разделяемой памяти, к которому подключен процесс пула
+_shared_graph = None
+
+
+def _shared_memory_batch(compact, chunks, max_workers):
+    offsets, targets = compact.offsets, compact.targets
+    offsets_size = offsets.itemsize * len(offsets)
+    size = offsets_size + targets.itemsize * len(targets)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        block.buf[:offsets_size] = offsets.tobytes()
+        block.buf[offsets_size:size] = targets.tobytes()
+        layout = (block.name, len(offsets), len(targets), _typecode(targets))
+        with ProcessPoolExecutor(
+            max_workers, initializer=_attach_shared_graph, initargs=layout
+        ) as executor:
+            return [
+                path
+                for paths in executor.map(_shared_shortest_paths, chunks)
+                for path in paths
+            ]
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _attach_shared_graph(name, offsets_length, targets_length, typecode):
+    global _shared_graph
+    block = shared_memory.SharedMemory(name=name)
+    offsets_size = 8 * offsets_length
+    size = offsets_size + targets_length * array(typecode).itemsize
+    offsets = block.buf[:offsets_size].cast("q")
+    targets = block.buf[offsets_size:size].cast(typecode)
+    _shared_graph = (block, offsets, targets)
+
 
-        while len(queue):
-            value = queue.pop(0)
-            for node in self.graph[value]:
-                if node not in dist_to.keys():
+def _shared_shortest_paths(queries):
+    _, offsets, targets = _shared_graph
+    return _csr_shortest_paths(offsets, targets, queries)
+
+
+def _csr_shortest_paths(offsets, targets, queries):
+    """BFS по массивам CSR для плоской последовательности пар `start, end`."""
+    paths = []
+    for index in range(0, len(queries), 2):
+        start, end = queries[index], queries[index + 1]
+        edge_to = {start: None}
+        queue = deque([start])
+        path = None
+        while queue and path is None:
+            value = queue.popleft()
+            for edge in range(offsets[value], offsets[value + 1]):
+                node = targets[edge]
+                if node not in edge_to:
                     edge_to[node] = value
-                    dist_to[node] = dist_to[value] + 1
+                    if node == end:
+                        path = array("q", _build_path(edge_to, end))
+                        break
                     queue.append(node)
-                    if end in edge_to.keys():
-                        path = []
-                        node = end
-                        while dist_to[node] != 0:
-                            path.insert(0, node)
-                            node = edge_to[node]
-                        path.insert(0, start)
-                        return path
+        paths.append(path)
+    return paths
+
+
+def _edge_function(graph, weights):
+    """Возвращает функцию `node -> [(сосед, стоимость), ...]` для выбранных весов."""
+    if weights is None:
+        if getattr(graph, "weights", None) is not None:
+            return graph.weighted_edges
+        return lambda node: [(neighbor, 1) for neighbor in graph.get(node, ())]
+    if callable(weights):
+        return lambda node: [
+            (neighbor, weights(node, neighbor)) for neighbor in graph.get(node, ())
+        ]
+    return lambda node: [
+        (neighbor, weights[node, neighbor]) for neighbor in graph.get(node, ())
+    ]
+
+
+def _build_path(edge_to, node):
+    path = []
+    while node is not None:
+        path.append(node)
+        node = edge_to[node]
+    path.reverse()
+    return path
+
+
+def _expand_level(frontier, neighbors, parent, dist, other_dist):
+    """
+    Раскрывает один уровень BFS и возвращает следующий фронт и узел встречи
+    с другой стороной поиска. Уровень раскрывается целиком, чтобы из всех
+    узлов встречи выбрать тот, что дает самый короткий путь.
+    """
+    next_frontier = []
+    meeting, best = None, None
+    for value in frontier:
+        depth = dist[value] + 1
+        for node in neighbors(value, ()):
+            if node not in dist:
+                parent[node] = value
+                dist[node] = depth
+                next_frontier.append(node)
+            if node in other_dist and parent.get(node) == value:
+                length = depth + other_dist[node]
+                if best is None or length < best:
+                    meeting, best = node, length
+    return next_frontier, meeting
+
+
+class CompactGraph(Mapping):
+    """Компактное представление графа в формате CSR (compressed sparse row).
+
+    Метки узлов интернируются в целочисленные идентификаторы, а списки смежности
+    хранятся в двух плоских массивах:
+
+    - `offsets[i]:offsets[i + 1]` - диапазон соседей узла `i`;
+    - `targets` - идентификаторы соседей всех узлов подряд.
+
+    Вместо миллионов маленьких списков граф занимает три объекта, при этом
+    он ведет себя как словарь `{метка: [метки соседей]}`, поэтому все методы
+    `GraphSearch.find_*` работают с ним без изменений.
+
+    Необязательный массив `weights` хранит стоимость каждого ребра в той же
+    позиции, что и `targets`.
+    """
+
+    def __init__(self, labels, offsets, targets, weights=None, ids=None):
+        self.labels = labels
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        if ids is None:
+            ids = {label: node_id for node_id, label in enumerate(labels)}
+        self._ids = ids
+        # отображение файла, которое держат открытым представления из `load`
+        self._mapping = None
+
+    @classmethod
+    def from_dict(cls, graph, weights=None):
+        """
+        Строит CSR из словаря `{метка: [метки соседей]}`. `weights` задается
+        так же, как в `GraphSearch`, и сохраняется в массив стоимостей ребер.
+        """
+        labels = list(graph)
+        ids = {label: node_id for node_id, label in enumerate(labels)}
+        offsets = array("q", [0])
+        targets = []
+        costs = None if weights is None else array("d")
+        for label in graph:
+            for neighbor in graph[label]:
+                if neighbor not in ids:
+                    ids[neighbor] = len(labels)
+                    labels.append(neighbor)
+                targets.append(ids[neighbor])
+                if costs is not None:
+                    if callable(weights):
+                        costs.append(weights(label, neighbor))
+                    else:
+                        costs.append(weights[label, neighbor])
+            offsets.append(len(targets))
+        # узлы, которые встречаются только среди соседей, не имеют исходящих ребер
+        offsets.extend([len(targets)] * (len(labels) + 1 - len(offsets)))
+        typecode = "i" if len(labels) < 2**31 else "q"
+        return cls(labels, offsets, array(typecode, targets), costs, ids=ids)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def node_id(self, label):
+        return self._ids.get(label)
+
+    def neighbor_ids(self, node_id):
+        start, stop = self.offsets[node_id], self.offsets[node_id + 1]
+        return self.targets[start:stop]
+
+    def weighted_edges(self, label):
+        node_id = self._ids.get(label)
+        if node_id is None:
+            return []
+        labels, targets, weights = self.labels, self.targets, self.weights
+        start, stop = self.offsets[node_id], self.offsets[node_id + 1]
+        return [(labels[targets[edge]], weights[edge]) for edge in range(start, stop)]
+
+    def reversed(self):
+        """Возвращает граф с развернутыми ребрами, построенный сортировкой подсчетом."""
+        node_count = len(self.labels)
+        offsets = array("q", [0]) * (node_count + 1)
+        for target in self.targets:
+            offsets[target + 1] += 1
+        for node_id in range(node_count):
+            offsets[node_id + 1] += offsets[node_id]
+        targets = array(_typecode(self.targets), [0]) * len(self.targets)
+        weights = None if self.weights is None else array("d", self.weights)
+        fill = offsets[:-1]
+        for node_id in range(node_count):
+            for edge in range(self.offsets[node_id], self.offsets[node_id + 1]):
+                target = self.targets[edge]
+                targets[fill[target]] = node_id
+                if weights is not None:
+                    weights[fill[target]] = self.weights[edge]
+                fill[target] += 1
+        return type(self)(self.labels, offsets, targets, weights, ids=self._ids)
+
+    def memory_usage(self):
+        """
+        Возвращает приблизительный объем памяти графа в байтах по составляющим.
+        Строки меток учитываются один раз, даже если на них ссылаются и
+        список меток, и словарь идентификаторов. Для графа, загруженного через
+        `load`, массивы лежат в отображенном файле, а не в куче процесса.
+        """
+        labels = self.labels
+        usage = {
+            "offsets": self.offsets.itemsize * len(self.offsets),
+            "targets": self.targets.itemsize * len(self.targets),
+            "labels": sys.getsizeof(labels),
+            "index": sys.getsizeof(self._ids),
+        }
+        if isinstance(labels, list):
+            usage["labels"] += sum(sys.getsizeof(label) for label in labels)
+        if self.weights is not None:
+            usage["weights"] = self.weights.itemsize * len(self.weights)
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def save(self, path):
+        """
+        Записывает граф в двоичный файл, который `load` отображает в память.
+
+        Формат (little-endian, все секции выровнены по 8 байт):
+
+        - заголовок `_FILE_HEADER`: сигнатура, версия, флаги, число узлов,
+          число ребер и размер блока меток;
+        - `offsets`: n + 1 чисел int64;
+        - `targets`: m чисел int32 (int64 при флаге `_WIDE_TARGETS`);
+        - `weights`: m чисел float64, только при флаге `_HAS_WEIGHTS`;
+        - смещения меток: n + 1 чисел int64 внутри блока меток;
+        - порядок меток: n чисел int64, идентификаторы узлов, отсортированные
+          по байтам меток, для двоичного поиска;
+        - блок меток: метки в UTF-8 подряд.
+
+        Метки должны быть строками.
+        """
+        if not all(isinstance(label, str) for label in self.labels):
+            raise TypeError("only str node labels can be saved")
+        encoded = [label.encode("utf-8") for label in self.labels]
+        label_offsets = array("q", [0])
+        for label in encoded:
+            label_offsets.append(label_offsets[-1] + len(label))
+        order = array("q", sorted(range(len(encoded)), key=encoded.__getitem__))
+        flags = 0
+        if _typecode(self.targets) == "q":
+            flags |= _WIDE_TARGETS
+        if self.weights is not None:
+            flags |= _HAS_WEIGHTS
+        sections = [
+            array("q", self.offsets),
+            array(_typecode(self.targets), self.targets),
+        ]
+        if self.weights is not None:
+            sections.append(array("d", self.weights))
+        sections += [label_offsets, order]
+        with open(path, "wb") as file:
+            file.write(
+                _FILE_HEADER.pack(
+                    _FILE_MAGIC,
+                    _FILE_VERSION,
+                    flags,
+                    len(self.labels),
+                    len(self.targets),
+                    label_offsets[-1],
+                )
+            )
+            for section in sections:
+                data = section.tobytes()
+                file.write(data)
+                file.write(bytes(-len(data) % 8))
+            file.write(b"".join(encoded))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Открывает файл, записанный `save`, через `mmap` без чтения в память:
+        массивы CSR и метки являются представлениями отображенного файла,
+        страницы подгружаются при первом обращении, а процессы, открывшие
+        один и тот же файл, делят страничный кэш. Метка ищется двоичным
+        поиском по отсортированному порядку меток.
+        """
+        with open(path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(mapping)
+        magic, version, flags, node_count, edge_count, label_size = (
+            _FILE_HEADER.unpack_from(buffer)
+        )
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            raise ValueError(f"{path} is not a graph file of version {_FILE_VERSION}")
+        position = _FILE_HEADER.size
+
+        def section(typecode, length):
+            nonlocal position
+            start = position
+            stop = start + array(typecode).itemsize * length
+            position = stop + -stop % 8
+            return buffer[start:stop].cast(typecode)
+
+        offsets = section("q", node_count + 1)
+        targets = section("q" if flags & _WIDE_TARGETS else "i", edge_count)
+        weights = section("d", edge_count) if flags & _HAS_WEIGHTS else None
+        label_offsets = section("q", node_count + 1)
+        order = section("q", node_count)
+        stop = position + label_size
+        blob = buffer[position:stop]
+        labels = _MappedLabels(label_offsets, blob)
+        graph = cls(labels, offsets, targets, weights, _MappedLabelIndex(labels, order))
+        graph._mapping = mapping
+        return graph
+
+    def __getitem__(self, label):
+        labels = self.labels
+        return [labels[target] for target in self.neighbor_ids(self._ids[label])]
+
+    def get(self, label, default=None):
+        node_id = self._ids.get(label)
+        if node_id is None:
+            return default
+        labels = self.labels
+        return [labels[target] for target in self.neighbor_ids(node_id)]
+
+    def __contains__(self, label):
+        return label in self._ids
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+
+_FILE_MAGIC = b"GSCSR\x00\x00\x00"
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct("<8sIIqqq")
+_WIDE_TARGETS = 1
+_HAS_WEIGHTS = 2
+
+
+class _MappedLabels(Sequence):
+    """Метки узлов, которые декодируются из отображенного файла по требованию."""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __getitem__(self, node_id):
+        if not 0 <= node_id < len(self):
+            raise IndexError(node_id)
+        start, stop = self._offsets[node_id], self._offsets[node_id + 1]
+        return str(self._blob[start:stop], "utf-8")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def encoded(self, node_id):
+        start, stop = self._offsets[node_id], self._offsets[node_id + 1]
+        return bytes(self._blob[start:stop])
+
+
+class _MappedLabelIndex:
+    """Поиск идентификатора по метке двоичным поиском вместо словаря."""
+
+    def __init__(self, labels, order):
+        self._labels = labels
+        self._order = order
+
+    def get(self, label, default=None):
+        if not isinstance(label, str):
+            return default
+        key = label.encode("utf-8")
+        low, high = 0, len(self._order)
+        while low < high:
+            middle = (low + high) // 2
+            node_id = self._order[middle]
+            candidate = self._labels.encoded(node_id)
+            if candidate == key:
+                return node_id
+            if candidate < key:
+                low = middle + 1
+            else:
+                high = middle
+        return default
+
+    def __getitem__(self, label):
+        node_id = self.get(label)
+        if node_id is None:
+            raise KeyError(label)
+        return node_id
+
+    def __contains__(self, label):
+        return self.get(label) is not None
+
+
+def _typecode(buffer):
+    return buffer.typecode if isinstance(buffer, array) else buffer.format
 
 
 def main():
@@ -122,6 +1611,15 @@ def main():
     [['A', 'B', 'C', 'D'], ['A', 'B', 'D'], ['A', 'C', 'D']]
     >>> print(graph_search.find_shortest_path_dfs('A', 'D'))
     ['A', 'B', 'D']
+
+    # paths are produced one by one and the enumeration may stop early
+    >>> paths = graph_search.iter_all_paths('A', 'D')
+    >>> next(paths)
+    ['A', 'B', 'C', 'D']
+    >>> list(graph_search.iter_all_paths('A', 'D', max_depth=2))
+    [['A', 'B', 'D'], ['A', 'C', 'D']]
+    >>> list(graph_search.iter_all_paths('A', 'D', max_paths=1))
+    [['A', 'B', 'C', 'D']]
     >>> print(graph_search.find_shortest_path_dfs('A', 'F'))
     ['A', 'C', 'G', 'E', 'F']
 
@@ -141,6 +1639,107 @@ def main():
     # non existing node
     >>> print(graph_search.find_shortest_path_bfs('A', 'X'))
     None
+
+    # with a reachability index negative queries are answered without search
+    >>> index = graph_search.build_reachability_index()
+    >>> index.component_count
+    4
+    >>> print(graph_search.find_path_dfs('C', 'H'))
+    None
+    >>> index.maybe_reachable('A', 'F'), index.maybe_reachable('E', 'A')
+    (True, False)
+
+    # a batch of queries answered in a process pool over shared memory
+    >>> graph_search.find_paths_batch([('A', 'F'), ('C', 'H'), ('G', 'F')], max_workers=2)
+    [['A', 'C', 'G', 'E', 'F'], None, ['G', 'E', 'F']]
+
+    # hop distances from many sources in one pass, indexed by compact node id
+    >>> rows = graph_search.multi_source_bfs(['A', 'G'])
+    >>> rows[0].tolist()
+    [0, 1, 1, 2, 3, 4, 2, -1]
+    >>> dict(zip(graph_search.as_compact().labels, rows[1]))
+    {'A': -1, 'B': -1, 'C': 3, 'D': 4, 'E': 1, 'F': 2, 'G': 0, 'H': -1}
+
+    # landmark lower bounds and approximate distances
+    >>> landmarks = graph_search.build_landmarks(k=2, seed=1)
+    >>> landmarks.stats['landmarks'], landmarks.stats['bytes']
+    (2, 256)
+    >>> landmarks.lower_bound('A', 'F') <= 4 <= landmarks.upper_bound('A', 'F')
+    True
+    >>> print(graph_search.find_shortest_path_astar('A', 'F'))
+    ['A', 'C', 'G', 'E', 'F']
+
+    # edges may change while cached trees and indexes are kept up to date
+    >>> dynamic = GraphSearch({'A': ['B'], 'B': ['C']})
+    >>> dynamic.shortest_path_tree('A').distance_to('C')
+    2
+    >>> dynamic.add_edge('A', 'C')
+    >>> dynamic.shortest_path_tree('A').distance_to('C')
+    1
+    >>> dynamic.remove_edge('A', 'B')
+    >>> print(dynamic.shortest_path_tree('A').path_to('B'))
+    None
+
+    # search from both ends at once
+    >>> print(graph_search.find_shortest_path_bidirectional('A', 'F'))
+    ['A', 'C', 'G', 'E', 'F']
+    >>> print(graph_search.find_shortest_path_bidirectional('A', 'H'))
+    None
+
+    # the same graph in the compact CSR form
+    >>> compact = CompactGraph.from_dict(graph)
+    >>> compact.offsets.tolist(), compact.targets.tolist()
+    ([0, 2, 4, 6, 7, 8, 9, 10, 11], [1, 2, 2, 3, 3, 6, 2, 5, 2, 4, 2])
+    >>> compact['C']
+    ['D', 'G']
+
+    >>> compact_search = GraphSearch(compact)
+    >>> print(compact_search.find_all_paths_dfs('A', 'D'))
+    [['A', 'B', 'C', 'D'], ['A', 'B', 'D'], ['A', 'C', 'D']]
+    >>> print(compact_search.find_shortest_path_bfs('A', 'F'))
+    ['A', 'C', 'G', 'E', 'F']
+    >>> print(compact_search.find_path_dfs('C', 'X'))
+    None
+
+    >>> usage = compact.memory_usage()
+    >>> usage['offsets'], usage['targets']
+    (72, 44)
+
+    # the compact graph can be saved and memory-mapped back
+    >>> import os, tempfile
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> path = os.path.join(directory.name, 'graph.csr')
+    >>> compact.save(path)
+    >>> mapped = CompactGraph.load(path)
+    >>> mapped['C'], mapped.node_id('G'), 'X' in mapped
+    (['D', 'G'], 6, False)
+    >>> print(GraphSearch(mapped).find_shortest_path_bfs('A', 'F'))
+    ['A', 'C', 'G', 'E', 'F']
+    >>> directory.cleanup()
+
+    # weighted search: the direct edge B -> D is expensive
+    >>> weights = {(node, neighbor): 1 for node in graph for neighbor in graph[node]}
+    >>> weights['B', 'D'] = 5
+    >>> weighted_search = GraphSearch(graph, weights)
+    >>> print(weighted_search.find_shortest_path_dijkstra('A', 'D'))
+    ['A', 'C', 'D']
+    >>> weighted_search.path_cost(['A', 'B', 'D'])
+    6
+
+    # A* with a heuristic that never overestimates the remaining cost
+    >>> print(weighted_search.find_shortest_path_astar('A', 'F', lambda node, end: 0))
+    ['A', 'C', 'G', 'E', 'F']
+
+    # one single-source tree answers every query from 'A'
+    >>> tree = weighted_search.shortest_path_tree('A')
+    >>> tree.distance_to('F'), tree.path_to('D')
+    (4, ['A', 'C', 'D'])
+    >>> print(tree.path_to('H'))
+    None
+
+    # alternative routes, the cheapest first
+    >>> list(weighted_search.iter_shortest_paths('A', 'D'))
+    [['A', 'C', 'D'], ['A', 'B', 'C', 'D'], ['A', 'B', 'D']]
     """
 
 
@@ -0,0 +1,253 @@
+"""
+Замеры производительности `GraphSearch` на синтетических графах.
+
+Генераторы строят графы четырех видов заданного размера:
+
+- `random_graph` - случайный граф с заданным числом ребер (модель Эрдёша-Реньи);
+- `grid_graph` - решетка, где каждый узел связан с соседями по горизонтали и вертикали;
+- `power_law_graph` - граф с предпочтительным присоединением (модель Барабаши-Альберт),
+  степени узлов распределены по степенному закону;
+- `chain_graph` - длинная цепочка, на которой рекурсивные обходы упирались в предел рекурсии.
+
+`run_benchmarks` замеряет время каждого метода `find_*` и остальных движков
+поиска на словарном и компактном представлении графа, отдельным проходом
+под `tracemalloc` записывает пиковую память, и возвращает результаты в виде,
+пригодном для `json.dump`, чтобы сравнивать прогоны между версиями.
+
+Запуск из командной строки:
+
+    python -m patterns.other.graph_search_benchmark --sizes 1000 10000 --output results.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from patterns.other.graph_search import CompactGraph, GraphSearch
+
+GRAPH_KINDS = ("random", "grid", "power_law", "chain")
+
+# методы, перебирающие простые пути: на больших графах они не завершатся
+EXHAUSTIVE_METHODS = ("find_all_paths_dfs", "find_shortest_path_dfs", "iter_all_paths")
+
+
+def random_graph(nodes, edges, seed=None):
+    rng = random.Random(seed)
+    graph = {node: [] for node in range(nodes)}
+    for _ in range(edges):
+        graph[rng.randrange(nodes)].append(rng.randrange(nodes))
+    return graph
+
+
+def grid_graph(width, height):
+    graph = {}
+    for row in range(height):
+        for column in range(width):
+            node = row * width + column
+            neighbors = []
+            if column + 1 < width:
+                neighbors.append(node + 1)
+            if column > 0:
+                neighbors.append(node - 1)
+            if row + 1 < height:
+                neighbors.append(node + width)
+            if row > 0:
+                neighbors.append(node - width)
+            graph[node] = neighbors
+    return graph
+
+
+def power_law_graph(nodes, edges_per_node=3, seed=None):
+    rng = random.Random(seed)
+    graph = {node: [] for node in range(nodes)}
+    # каждый конец ребра попадает сюда, поэтому выбор из списка пропорционален степени
+    endpoints = []
+    for node in range(1, nodes):
+        for _ in range(min(edges_per_node, node)):
+            target = rng.choice(endpoints) if endpoints else rng.randrange(node)
+            graph[node].append(target)
+            graph[target].append(node)
+            endpoints += (node, target)
+    return graph
+
+
+def chain_graph(length):
+    graph = {node: [node + 1] for node in range(length - 1)}
+    graph[length - 1] = []
+    return graph
+
+
+def make_graph(kind, size, seed=None):
+    if kind == "random":
+        return random_graph(size, 4 * size, seed)
+    if kind == "grid":
+        side = max(1, int(size**0.5))
+        return grid_graph(side, side)
+    if kind == "power_law":
+        return power_law_graph(size, 3, seed)
+    if kind == "chain":
+        return chain_graph(size)
+    raise ValueError(f"unknown graph kind {kind!r}")
+
+
+def _query_methods(graph_search):
+    """Методы, отвечающие на запрос `(start, end)`, в виде `имя -> функция`."""
+    methods = {
+        name: getattr(graph_search, name)
+        for name in sorted(dir(graph_search))
+        if name.startswith("find_") and name != "find_paths_batch"
+    }
+    methods["iter_all_paths"] = lambda start, end: next(
+        graph_search.iter_all_paths(start, end), None
+    )
+    methods["iter_shortest_paths"] = lambda start, end: list(
+        graph_search.iter_shortest_paths(start, end, max_paths=10)
+    )
+    return methods
+
+
+# предварительные вычисления и пакетные запросы, которые замеряются целиком
+SETUP_STEPS = {
+    "as_compact": lambda search, queries: search.as_compact(),
+    "build_reachability_index": lambda search, queries: search.build_reachability_index(),
+    "build_landmarks": lambda search, queries: search.build_landmarks(k=4, seed=0),
+    "shortest_path_tree": lambda search, queries: search.shortest_path_tree(
+        queries[0][0]
+    ),
+    "find_paths_batch": lambda search, queries: search.find_paths_batch(
+        queries, max_workers=1
+    ),
+    "multi_source_bfs": lambda search, queries: search.multi_source_bfs(
+        [start for start, _ in queries]
+    ),
+}
+
+
+def _time_calls(function, calls):
+    started = time.perf_counter()
+    for arguments in calls:
+        function(*arguments)
+    return time.perf_counter() - started
+
+
+def _peak_memory(function, calls):
+    """Пиковая память отдельного прохода: `tracemalloc` замедляет вызовы и портит время."""
+    tracemalloc.start()
+    try:
+        for arguments in calls:
+            function(*arguments)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_graph(graph, kind, queries, exhaustive_limit=12):
+    """
+    Замеряет все методы на словарном и компактном представлении `graph`.
+    Методы из `EXHAUSTIVE_METHODS` запускаются только на графах не больше
+    `exhaustive_limit` узлов, иначе записываются как пропущенные.
+    """
+    results = []
+    backends = {"dict": graph, "compact": CompactGraph.from_dict(graph)}
+    edge_count = sum(len(neighbors) for neighbors in graph.values())
+    for backend, data in backends.items():
+        base = {
+            "graph": kind,
+            "nodes": len(graph),
+            "edges": edge_count,
+            "backend": backend,
+        }
+        for method, function in _query_methods(GraphSearch(data)).items():
+            row = dict(base, method=method, queries=len(queries))
+            if method in EXHAUSTIVE_METHODS and len(graph) > exhaustive_limit:
+                row["skipped"] = f"more than {exhaustive_limit} nodes"
+            else:
+                seconds = _time_calls(function, queries)
+                row.update(
+                    seconds=seconds,
+                    per_query_us=1e6 * seconds / max(len(queries), 1),
+                    peak_bytes=_peak_memory(function, queries),
+                )
+            results.append(row)
+        for method, step in SETUP_STEPS.items():
+            # каждый проход - на свежем объекте, чтобы не замерять готовый кэш
+            seconds = _time_calls(step, [(GraphSearch(data), queries)])
+            peak = _peak_memory(step, [(GraphSearch(data), queries)])
+            results.append(dict(base, method=method, seconds=seconds, peak_bytes=peak))
+    return results
+
+
+def run_benchmarks(
+    sizes, kinds=GRAPH_KINDS, query_count=100, seed=0, exhaustive_limit=12
+):
+    rng = random.Random(seed)
+    results = []
+    for kind in kinds:
+        for size in sizes:
+            graph = make_graph(kind, size, seed)
+            nodes = list(graph)
+            queries = [
+                (rng.choice(nodes), rng.choice(nodes)) for _ in range(query_count)
+            ]
+            results += benchmark_graph(graph, kind, queries, exhaustive_limit)
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sizes": list(sizes),
+            "kinds": list(kinds),
+            "queries": query_count,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main():
+    """
+    >>> chain_graph(4)
+    {0: [1], 1: [2], 2: [3], 3: []}
+    >>> grid_graph(2, 2)
+    {0: [1, 2], 1: [0, 3], 2: [3, 0], 3: [2, 1]}
+    >>> sum(map(len, random_graph(10, 25, seed=1).values()))
+    25
+    >>> graph = power_law_graph(50, 2, seed=1)
+    >>> sum(map(len, graph.values()))
+    194
+
+    >>> report = run_benchmarks([10, 30], kinds=['grid', 'chain'], query_count=5)
+    >>> sorted(report['meta'])
+    ['implementation', 'kinds', 'platform', 'python', 'queries', 'seed', 'sizes', 'timestamp']
+    >>> sorted({row['method'] for row in report['results']})[:4]
+    ['as_compact', 'build_landmarks', 'build_reachability_index', 'find_all_paths_dfs']
+    >>> [row['skipped'] for row in report['results'] if 'skipped' in row][0]
+    'more than 12 nodes'
+    >>> all('seconds' in row and 'peak_bytes' in row for row in report['results'] if 'skipped' not in row)
+    True
+    >>> text = json.dumps(report)
+    """
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--kinds", nargs="+", choices=GRAPH_KINDS, default=GRAPH_KINDS)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--exhaustive-limit", type=int, default=12)
+    parser.add_argument("--output", help="JSON file, stdout by default")
+    args = parser.parse_args()
+    report = run_benchmarks(
+        args.sizes, args.kinds, args.queries, args.seed, args.exhaustive_limit
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
@@ -6,8 +6,16 @@ in Python
 
 - single source 'message type' for state transition changes
 - message type considered, messages (comment) not considered to avoid complexity
+- state handlers are compiled once into a dense (state x message) transition table
+- an opt-in `TraceRecorder` keeps the last messages in a binary ring buffer, and
+  `replay` re-drives a fresh machine from a dumped trace
+- `snapshot` packs the states of many machines into one buffer, `restore` rebuilds them
 """
 
+import asyncio
+import struct
+import time
+
 
 class UnsupportedMessageType(BaseException):
     pass
@@ -22,29 +30,90 @@ class UnsupportedTransition(BaseException):
 
 
 class HierachicalStateMachine:
+    trace = None
+
     def __init__(self):
         self._active_state = Active(self)  # Unit.Inservice.Active()
         self._standby_state = Standby(self)  # Unit.Inservice.Standby()
         self._suspect_state = Suspect(self)  # Unit.OutOfService.Suspect()
         self._failed_state = Failed(self)  # Unit.OutOfService.Failed()
-        self._current_state = self._standby_state
         self.states = {
             "active": self._active_state,
             "standby": self._standby_state,
             "suspect": self._suspect_state,
             "failed": self._failed_state,
         }
-        self.message_types = {
-            "fault trigger": self._current_state.on_fault_trigger,
-            "switchover": self._current_state.on_switchover,
-            "diagnostics passed": self._current_state.on_diagnostics_passed,
-            "diagnostics failed": self._current_state.on_diagnostics_failed,
-            "operator inservice": self._current_state.on_operator_inservice,
+        self._state_id = self.table.state_ids["standby"]
+
+    @property
+    def _current_state(self):
+        return self.states[self.table.states[self._state_id]]
+
+    @_current_state.setter
+    def _current_state(self, state):
+        # accepts a state object or a state class
+        state_class = state if isinstance(state, type) else type(state)
+        self._state_id = self.table.state_class_ids[state_class]
+
+    SNAPSHOT_MAGIC = b"HSMS\x01"
+
+    @classmethod
+    def snapshot(cls, machines):
+        """
+        The current states of `machines` as bytes: a header naming the states,
+        then one state id byte per machine.
+        """
+        names = "\0".join(cls.table.states).encode()
+        header = cls.SNAPSHOT_MAGIC + struct.pack("<H", len(names)) + names
+        return header + bytes(machine._state_id for machine in machines)
+
+    @classmethod
+    def restore(cls, data):
+        """
+        Machines rebuilt from a `snapshot`, in order.
+
+        State ids are mapped by name, so a snapshot survives reordering of
+        the states. The restored machines share one set of state objects
+        bound to no machine (`_hsm` is None): they only identify the state,
+        dispatch goes through the table, so drive the machines with
+        `on_message` rather than the state handlers.
+        """
+        data = memoryview(data)
+        start = len(cls.SNAPSHOT_MAGIC)
+        if bytes(data[:start]) != cls.SNAPSHOT_MAGIC:
+            raise ValueError("not a state machine snapshot")
+        (size,) = struct.unpack_from("<H", data, start)
+        start += 2
+        end = start + size
+        names = bytes(data[start:end]).decode().split("\0")
+        try:
+            mapping = bytes(cls.table.state_ids[name] for name in names)
+        except KeyError:
+            raise UnsupportedState
+        state_ids = bytes(data[end:])
+        if state_ids and max(state_ids) >= len(mapping):
+            raise UnsupportedState
+        state_ids = state_ids.translate(mapping + bytes(256 - len(mapping)))
+        states = {
+            cls.table.states[state_id]: state_class(None)
+            for state_class, state_id in cls.table.state_class_ids.items()
         }
+        machines = []
+        for state_id in state_ids:
+            machine = cls.__new__(cls)
+            machine.states = states
+            machine._state_id = state_id
+            machines.append(machine)
+        return machines
+
+    def enable_trace(self, capacity=4096):
+        """Starts recording every message into a `TraceRecorder` of `capacity` records."""
+        self.trace = TraceRecorder(capacity)
+        return self.trace
 
     def _next_state(self, state):
         try:
-            self._current_state = self.states[state]
+            self._state_id = self.table.state_ids[state]
         except KeyError:
             raise UnsupportedState
 
@@ -79,10 +148,23 @@ class HierachicalStateMachine:
         return "check mate status"
 
     def on_message(self, message_type):  # message ignored
-        if message_type in self.message_types.keys():
-            self.message_types[message_type]()
-        else:
+        table = self.table
+        try:
+            message_id = table.message_ids[message_type]
+        except KeyError:
             raise UnsupportedMessageType
+        if self.trace is not None:
+            self.trace.record(self._state_id, message_id)
+        transition = table.transitions[
+            self._state_id * table.message_count + message_id
+        ]
+        if transition is None:
+            raise UnsupportedTransition
+        actions, next_state = transition
+        for action in actions:
+            getattr(self, action)()
+        if next_state is not None:
+            self._next_state(next_state)
 
 
 class Unit:
@@ -125,12 +207,12 @@ class Active(Inservice):
         self._hsm = HierachicalStateMachine
 
     def on_fault_trigger(self):
-        super().perform_switchover()
+        self._hsm._perform_switchover()
         super().on_fault_trigger()
 
     def on_switchover(self):
-        self._hsm.on_switchover()  # message ignored
-        self._hsm.next_state("standby")
+        super().on_switchover()  # message ignored
+        self._hsm._next_state("standby")
 
 
 class Standby(Inservice):
@@ -146,10 +228,9 @@ class OutOfService(Unit):
     def __init__(self, HierachicalStateMachine):
         self._hsm = HierachicalStateMachine
 
-    def on_operator_inservice(self):
-        self._hsm.on_switchover()  # message ignored
-        self._hsm.send_operator_inservice_response()
-        self._hsm.next_state("suspect")
+    def on_operator_inservice(self):  # message ignored
+        self._hsm._send_operator_inservice_response()
+        self._hsm._next_state("suspect")
 
 
 class Suspect(OutOfService):
@@ -157,16 +238,16 @@ class Suspect(OutOfService):
         self._hsm = HierachicalStateMachine
 
     def on_diagnostics_failed(self):
-        super().send_diagnostics_failure_report()
-        super().next_state("failed")
+        self._hsm._send_diagnostics_failure_report()
+        self._hsm._next_state("failed")
 
     def on_diagnostics_passed(self):
-        super().send_diagnostics_pass_report()
-        super().clear_alarm()  # loss of redundancy alarm
-        super().next_state("standby")
+        self._hsm._send_diagnostics_pass_report()
+        self._hsm._clear_alarm()  # loss of redundancy alarm
+        self._hsm._next_state("standby")
 
     def on_operator_inservice(self):
-        super().abort_diagnostics()
+        self._hsm._abort_diagnostics()
         super().on_operator_inservice()  # message ignored
 
 
@@ -175,3 +256,377 @@ class Failed(OutOfService):
 
     def __init__(self, HierachicalStateMachine):
         self._hsm = HierachicalStateMachine
+
+
+class TransitionTable:
+    """
+    The state hierarchy flattened into a dense (state x message) table.
+
+    Every handler of every state is run once against a recorder standing in
+    for the machine, so inherited behaviour and `super()` chains are resolved
+    at compile time. `transitions[state_id * message_count + message_id]` is
+    either None for an unsupported transition or a pair of the machine's
+    action method names, in call order, and the next state name (None to
+    stay), so dispatch is a single indexed lookup.
+    """
+
+    def __init__(self, state_classes, message_handlers):
+        self.states = list(state_classes)
+        self.state_ids = {name: index for index, name in enumerate(self.states)}
+        self.state_class_ids = {
+            state_class: index
+            for index, state_class in enumerate(state_classes.values())
+        }
+        self.messages = list(message_handlers)
+        self.message_ids = {name: index for index, name in enumerate(self.messages)}
+        self.message_count = len(self.messages)
+        self.transitions = []
+        for state_class in state_classes.values():
+            for handler in message_handlers.values():
+                recorder = _TransitionRecorder()
+                try:
+                    getattr(state_class(recorder), handler)()
+                except UnsupportedTransition:
+                    self.transitions.append(None)
+                else:
+                    self.transitions.append(
+                        (tuple(recorder.actions), recorder.next_state)
+                    )
+
+    def lookup(self, state, message_type):
+        """Returns the `(actions, next_state)` of `message_type` in the named `state`."""
+        state_id, message_id = self.state_ids[state], self.message_ids[message_type]
+        return self.transitions[state_id * self.message_count + message_id]
+
+
+class _TransitionRecorder:
+    """Records the actions and the transition a state handler asks the machine for."""
+
+    def __init__(self):
+        self.actions = []
+        self.next_state = None
+
+    def _next_state(self, state):
+        self.next_state = state
+
+    def __getattr__(self, name):
+        if not name.startswith("_") or not callable(
+            getattr(HierachicalStateMachine, name, None)
+        ):
+            raise AttributeError(name)
+        return lambda: self.actions.append(name)
+
+
+HierachicalStateMachine.table = TransitionTable(
+    {"active": Active, "standby": Standby, "suspect": Suspect, "failed": Failed},
+    {
+        "fault trigger": "on_fault_trigger",
+        "switchover": "on_switchover",
+        "diagnostics passed": "on_diagnostics_passed",
+        "diagnostics failed": "on_diagnostics_failed",
+        "operator inservice": "on_operator_inservice",
+    },
+)
+
+
+class TraceRecorder:
+    """
+    The last `capacity` messages a machine received, as fixed-size binary records.
+
+    Each record is `(timestamp, state id, message id)`, the state being the
+    one the message arrived in, packed with `RECORD` into a buffer allocated
+    up front, so recording is a `pack_into` and no objects are kept. Once
+    full, new records overwrite the oldest. `dump` returns the records oldest
+    first as bytes, which `load` and `replay` accept.
+    """
+
+    RECORD = struct.Struct("<dBB")
+
+    def __init__(self, capacity=4096, clock=time.time):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.clock = clock
+        self.buffer = bytearray(capacity * self.RECORD.size)
+        self.total = 0
+
+    def record(self, state_id, message_id):
+        offset = self.total % self.capacity * self.RECORD.size
+        self.RECORD.pack_into(self.buffer, offset, self.clock(), state_id, message_id)
+        self.total += 1
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def dropped(self):
+        """How many records were overwritten."""
+        return self.total - len(self)
+
+    def dump(self):
+        if self.total <= self.capacity:
+            return bytes(self.buffer[: len(self) * self.RECORD.size])
+        split = self.total % self.capacity * self.RECORD.size
+        return bytes(self.buffer[split:] + self.buffer[:split])
+
+    @classmethod
+    def load(cls, data):
+        """The `(timestamp, state id, message id)` records of a dump."""
+        return list(cls.RECORD.iter_unpack(data))
+
+    def __iter__(self):
+        return iter(self.load(self.dump()))
+
+    def __repr__(self):
+        return f"<TraceRecorder {len(self)}/{self.capacity} records, {self.dropped} dropped>"
+
+
+def replay(trace, machine=None):
+    """
+    Re-drives `machine` (a fresh `HierachicalStateMachine` by default) with a
+    trace, given as a `TraceRecorder` or its dump.
+
+    The machine starts in the state of the first record. Returns one
+    `(timestamp, state, message_type, outcome)` step per record, where
+    outcome is the state after the message or the name of the exception it
+    raised. A record that does not start in the state the machine reached
+    means the trace is not contiguous and raises ValueError.
+    """
+    if machine is None:
+        machine = HierachicalStateMachine()
+    if isinstance(trace, TraceRecorder):
+        trace = trace.dump()
+    table = machine.table
+    steps = []
+    for index, (timestamp, state_id, message_id) in enumerate(
+        TraceRecorder.load(trace)
+    ):
+        if not steps:
+            machine._state_id = state_id
+        elif machine._state_id != state_id:
+            raise ValueError(
+                f"record {index} starts in {table.states[state_id]!r},"
+                f" replay reached {table.states[machine._state_id]!r}"
+            )
+        message_type = table.messages[message_id]
+        try:
+            machine.on_message(message_type)
+        except (UnsupportedState, UnsupportedTransition) as error:
+            outcome = type(error).__name__
+        else:
+            outcome = table.states[machine._state_id]
+        steps.append((timestamp, table.states[state_id], message_type, outcome))
+    return steps
+
+
+class FleetStep:
+    """
+    Aggregated side effects of one `HsmFleet.apply` step.
+
+    `actions[name]` holds one byte per unit, 1 where the unit performed the
+    action, and `counts[name]` how many units did. `unsupported` flags the
+    units whose message was not supported in their state; they keep it.
+    """
+
+    def __init__(self, actions, unsupported):
+        self.actions = actions
+        self.counts = {name: fired.count(1) for name, fired in actions.items()}
+        self.unsupported = unsupported
+        self.unsupported_count = unsupported.count(1)
+
+
+class HsmFleet:
+    """
+    The state machines of many units, without one object per unit.
+
+    Each unit's state id is a byte of `states`. A step takes one message id
+    per unit (`idle` for none) and combines them with the states into
+    `state * (message_count + 1) + message` keys for the whole fleet with
+    one big integer multiply-add: every byte is a lane and the keys fit
+    in a byte, so no lane carries into the next. The compiled transition
+    table then becomes 256-byte translation tables, and `bytes.translate`
+    gives the next states, the unsupported flags and one 0/1 array per
+    action, all in C loops over the fleet.
+    """
+
+    def __init__(self, size, initial_state="standby", table=None):
+        self.table = HierachicalStateMachine.table if table is None else table
+        table = self.table
+        self.size = size
+        self.idle = table.message_count
+        lanes = table.message_count + 1
+        if len(table.states) * lanes > 256:
+            raise ValueError("transition table does not fit in byte lanes")
+        self._lanes = lanes
+        self.states = bytearray([table.state_ids[initial_state]]) * size
+        next_states = bytearray(range(256))
+        unsupported = bytearray(256)
+        fired = {}
+        for state_id in range(len(table.states)):
+            for message_id in range(table.message_count):
+                key = state_id * lanes + message_id
+                transition = table.transitions[
+                    state_id * table.message_count + message_id
+                ]
+                if transition is None:
+                    unsupported[key] = 1
+                    next_states[key] = state_id
+                    continue
+                actions, next_state = transition
+                next_states[key] = (
+                    state_id if next_state is None else table.state_ids[next_state]
+                )
+                for action in actions:
+                    fired.setdefault(action, bytearray(256))[key] = 1
+            next_states[state_id * lanes + self.idle] = state_id
+        self._next_states = bytes(next_states)
+        self._unsupported = bytes(unsupported)
+        self._fired = {action: bytes(lookup) for action, lookup in fired.items()}
+
+    def encode(self, message_types):
+        """Message ids for a sequence of message types, None meaning no message."""
+        ids = self.table.message_ids
+        try:
+            return bytes(
+                self.idle if message is None else ids[message]
+                for message in message_types
+            )
+        except KeyError:
+            raise UnsupportedMessageType
+
+    def apply(self, messages):
+        """
+        Delivers one message to every unit and returns a `FleetStep`.
+
+        `messages` is a message type sent to the whole fleet, or a bytes-like
+        object with a message id per unit, as made by `encode`.
+        """
+        if isinstance(messages, str):
+            messages = self.encode([messages]) * self.size
+        elif len(messages) != self.size:
+            raise ValueError(f"expected {self.size} messages, got {len(messages)}")
+        elif messages and max(messages) > self.idle:
+            raise UnsupportedMessageType
+        keys = (
+            int.from_bytes(self.states, "little") * self._lanes
+            + int.from_bytes(messages, "little")
+        ).to_bytes(self.size, "little")
+        self.states[:] = keys.translate(self._next_states)
+        actions = {
+            action: keys.translate(lookup) for action, lookup in self._fired.items()
+        }
+        return FleetStep(actions, keys.translate(self._unsupported))
+
+    def state_of(self, unit):
+        return self.table.states[self.states[unit]]
+
+    def state_counts(self):
+        return {
+            name: self.states.count(state_id)
+            for state_id, name in enumerate(self.table.states)
+        }
+
+
+class HsmRunner:
+    """
+    Feeds a machine from a bounded asyncio queue.
+
+    Producers `submit` message types; `run` takes them off the queue in
+    batches of up to `batch_size` and hands them to `on_message`, yielding
+    to the event loop between batches. When the queue holds `maxsize`
+    messages the `policy` decides: "block" makes `submit` wait
+    (backpressure), "drop_newest" discards the new message and
+    "drop_oldest" the oldest queued one. Unsupported messages, transitions
+    and states, and exceptions raised by actions, are counted in `errors`
+    instead of stopping the runner.
+    `metrics` reports queue depth and the latency from `submit` until the
+    message was handled.
+    """
+
+    POLICIES = ("block", "drop_newest", "drop_oldest")
+    # the Unsupported* exceptions derive from BaseException, not Exception
+    ERRORS = (
+        UnsupportedMessageType,
+        UnsupportedState,
+        UnsupportedTransition,
+        Exception,
+    )
+
+    def __init__(self, machine, maxsize=1024, batch_size=64, policy="block"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown policy {policy!r}")
+        self.machine = machine
+        self.batch_size = batch_size
+        self.policy = policy
+        self.maxsize = maxsize
+        self._queue = None
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def queue(self):
+        # created on first use, so that it belongs to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.maxsize)
+        return self._queue
+
+    async def submit(self, message_type):
+        """Queues a message, returns False if the drop policy discarded it."""
+        item = (message_type, time.perf_counter())
+        queue = self.queue
+        if queue.full():
+            if self.policy == "block":
+                await queue.put(item)
+                self.max_depth = max(self.max_depth, queue.qsize())
+                return True
+            self.dropped += 1
+            if self.policy == "drop_newest":
+                return False
+            queue.get_nowait()
+            queue.task_done()
+        queue.put_nowait(item)
+        self.max_depth = max(self.max_depth, queue.qsize())
+        return True
+
+    async def run(self):
+        """Handles messages until cancelled."""
+        queue = self.queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            for message_type, submitted in batch:
+                try:
+                    self.machine.on_message(message_type)
+                except self.ERRORS:
+                    self.errors += 1
+                finally:
+                    queue.task_done()
+                latency = time.perf_counter() - submitted
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                self.processed += 1
+            self.batches += 1
+            await asyncio.sleep(0)
+
+    async def join(self):
+        """Waits until every queued message has been handled."""
+        await self.queue.join()
+
+    def metrics(self):
+        handled = self.processed or 1
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "batches": self.batches,
+            "latency_mean": self.latency_total / handled,
+            "latency_max": self.latency_max,
+        }
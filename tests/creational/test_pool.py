@@ -1,7 +1,15 @@
+import asyncio
 import queue
+import threading
 import unittest
+from itertools import count
 
-from patterns.creational.pool import ObjectPool
+from patterns.creational.pool import (
+    AsyncObjectPool,
+    BoundedObjectPool,
+    ObjectPool,
+    PoolClosed,
+)
 
 
 class TestPool(unittest.TestCase):
@@ -49,3 +57,323 @@ class TestNaitivePool(unittest.TestCase):
     # print('Outside func: {}'.format(sample_queue.get()))
 
     # if not sample_queue.empty():
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBoundedObjectPool(unittest.TestCase):
+    def setUp(self):
+        self.numbers = count()
+        self.disposed = []
+        self.clock = FakeClock()
+
+    def make_pool(self, **kwargs):
+        kwargs.setdefault("dispose", self.disposed.append)
+        return BoundedObjectPool(lambda: next(self.numbers), clock=self.clock, **kwargs)
+
+    def test_objects_are_created_lazily_up_to_max_size(self):
+        pool = self.make_pool(max_size=2)
+        self.assertEqual(pool.size, 0)
+        first, second = pool.get(), pool.get()
+        self.assertEqual((first, second), (0, 1))
+        with self.assertRaises(TimeoutError):
+            pool.get(timeout=0.01)
+        pool.put(first)
+        self.assertEqual(pool.get(timeout=0), first)
+        self.assertEqual(pool.created, 2)
+
+    def test_warm_up_creates_min_size_objects(self):
+        pool = self.make_pool(min_size=3, max_size=5)
+        self.assertEqual(pool.stats()["idle"], 3)
+        self.assertIn(pool.get(), (0, 1, 2))
+
+    def test_waiting_get_receives_returned_object(self):
+        pool = self.make_pool(max_size=1)
+        item = pool.get()
+        timer = threading.Timer(0.05, pool.put, (item,))
+        timer.start()
+        self.assertEqual(pool.get(timeout=5), item)
+        timer.join()
+
+    def test_unhealthy_objects_are_replaced_on_checkout(self):
+        pool = self.make_pool(max_size=2, validate=lambda item: item % 2)
+        with pool.acquire() as item:
+            self.assertEqual(item, 0)
+        self.assertEqual(pool.get(), 1)
+        self.assertEqual(self.disposed, [0])
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_idle_objects_are_evicted_after_ttl_down_to_min_size(self):
+        pool = self.make_pool(min_size=1, max_size=3, idle_ttl=10)
+        items = [pool.get() for _ in range(3)]
+        for item in items:
+            pool.put(item)
+        self.clock.now = 5
+        self.assertEqual(pool.evict_idle(), 0)
+        self.clock.now = 11
+        self.assertEqual(pool.evict_idle(), 2)
+        self.assertEqual(self.disposed, items[:2])
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_foreign_and_double_put_are_rejected(self):
+        pool = self.make_pool()
+        item = pool.get()
+        pool.put(item)
+        with self.assertRaises(ValueError):
+            pool.put(item)
+        with self.assertRaises(ValueError):
+            pool.put(object())
+
+    def test_factory_returning_the_same_object_keeps_capacity(self):
+        pool = BoundedObjectPool(lambda: "connection", max_size=2)
+        first, second = pool.get(), pool.get()
+        self.assertIs(first, second)
+        pool.put(first)
+        pool.put(second)
+        with self.assertRaises(ValueError):
+            pool.put(first)
+        self.assertEqual(pool.stats()["idle"], 2)
+        self.assertEqual([pool.get(timeout=0) for _ in range(2)], [first] * 2)
+        self.assertEqual(pool.stats()["in_use"], 2)
+
+    def test_failed_factory_frees_its_slot(self):
+        calls = count()
+
+        def factory():
+            if next(calls) == 0:
+                raise OSError("connection refused")
+            return "connection"
+
+        pool = BoundedObjectPool(factory, max_size=1)
+        with self.assertRaises(OSError):
+            pool.get()
+        self.assertEqual(pool.get(timeout=0), "connection")
+
+    def test_failed_warm_up_frees_unused_slots(self):
+        calls = count()
+
+        def factory():
+            if next(calls) == 1:
+                raise OSError("connection refused")
+            return object()
+
+        pool = BoundedObjectPool(factory, max_size=3)
+        pool.min_size = 3
+        with self.assertRaises(OSError):
+            pool.warm_up()
+        self.assertEqual(pool.stats()["size"], 1)
+        items = [pool.get(timeout=0) for _ in range(3)]
+        self.assertEqual(len(set(map(id, items))), 3)
+
+    def test_close_disposes_idle_and_returned_objects(self):
+        pool = self.make_pool(min_size=2)
+        leased = pool.get()
+        pool.close()
+        self.assertEqual(self.disposed, [1 - leased])
+        pool.put(leased)
+        self.assertEqual(sorted(self.disposed), [0, 1])
+        with self.assertRaises(PoolClosed):
+            pool.get()
+
+    def test_concurrent_use_never_exceeds_max_size(self):
+        pool = BoundedObjectPool(object, max_size=3)
+        lock = threading.Lock()
+        leased, peak = set(), []
+
+        def worker():
+            for _ in range(200):
+                with pool.acquire(timeout=5) as item:
+                    with lock:
+                        self.assertNotIn(item, leased)
+                        leased.add(item)
+                        peak.append(len(leased))
+                    with lock:
+                        leased.remove(item)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 3)
+        self.assertLessEqual(pool.created, 3)
+        self.assertEqual(pool.stats()["in_use"], 0)
+
+
+class TestAsyncObjectPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.numbers = count()
+        self.disposed = []
+        self.clock = FakeClock()
+
+    async def factory(self):
+        await asyncio.sleep(0)
+        return next(self.numbers)
+
+    async def dispose(self, item):
+        self.disposed.append(item)
+
+    def make_pool(self, **kwargs):
+        return AsyncObjectPool(
+            self.factory, clock=self.clock, dispose=self.dispose, **kwargs
+        )
+
+    async def test_async_factory_creates_objects_up_to_max_size(self):
+        pool = self.make_pool(max_size=2)
+        async with pool.acquire() as first:
+            async with pool.acquire() as second:
+                self.assertEqual((first, second), (0, 1))
+                with self.assertRaises(TimeoutError):
+                    await pool.get(timeout=0.01)
+        self.assertEqual(pool.stats()["idle"], 2)
+
+    async def test_warm_up_on_enter_and_close_on_exit(self):
+        async with self.make_pool(min_size=2) as pool:
+            self.assertEqual(pool.stats()["idle"], 2)
+        self.assertEqual(sorted(self.disposed), [0, 1])
+        with self.assertRaises(PoolClosed):
+            await pool.get()
+
+    async def test_waiters_are_served_in_fifo_order(self):
+        pool = self.make_pool(max_size=1)
+        item = await pool.get()
+        order = []
+
+        async def worker(name):
+            async with pool.acquire():
+                order.append(name)
+                await asyncio.sleep(0)
+
+        tasks = []
+        for name in "abcd":
+            tasks.append(asyncio.ensure_future(worker(name)))
+            await asyncio.sleep(0)
+        self.assertEqual(pool.waiting, 4)
+        await pool.put(item)
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, list("abcd"))
+        self.assertEqual(pool.created, 1)
+
+    async def test_cancelled_waiter_does_not_lose_the_object(self):
+        pool = self.make_pool(max_size=1)
+        item = await pool.get()
+        cancelled = asyncio.ensure_future(pool.get())
+        waiting = asyncio.ensure_future(pool.get())
+        await asyncio.sleep(0)
+        # объект передан первой задаче, но она отменена раньше, чем проснулась
+        await pool.put(item)
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        self.assertEqual(await asyncio.wait_for(waiting, 1), item)
+        self.assertEqual(pool.stats()["in_use"], 1)
+
+    async def test_cancelled_holder_returns_the_object(self):
+        pool = self.make_pool(max_size=1)
+
+        async def holder():
+            async with pool.acquire():
+                await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(holder())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(await pool.get(timeout=0), 0)
+
+    async def test_unhealthy_objects_are_replaced_and_idle_ones_evicted(self):
+        async def validate(item):
+            return item != 0
+
+        pool = self.make_pool(max_size=3, idle_ttl=10, validate=validate)
+        first, second = await pool.get(), await pool.get()
+        await pool.put(first)
+        self.assertEqual(await pool.get(), 2)
+        self.assertEqual(self.disposed, [0])
+        await pool.put(second)
+        self.clock.now = 20
+        self.assertEqual(await pool.evict_idle(), 1)
+        self.assertEqual(self.disposed, [0, 1])
+
+    async def test_factory_returning_the_same_object_keeps_capacity(self):
+        pool = AsyncObjectPool(lambda: 7, max_size=2)
+        first, second = await pool.get(), await pool.get()
+        await pool.put(first)
+        await pool.put(second)
+        self.assertEqual(pool.stats()["idle"], 2)
+        self.assertEqual([await pool.get(timeout=0) for _ in range(2)], [7, 7])
+
+    async def test_failed_warm_up_frees_unused_slots(self):
+        calls = count()
+
+        async def factory():
+            if next(calls) == 1:
+                raise OSError("connection refused")
+            return object()
+
+        pool = AsyncObjectPool(factory, max_size=3)
+        pool.min_size = 3
+        with self.assertRaises(OSError):
+            await pool.warm_up()
+        self.assertEqual((pool.stats()["size"], pool.stats()["idle"]), (1, 1))
+        items = [await pool.get(timeout=0) for _ in range(3)]
+        self.assertEqual(len(set(map(id, items))), 3)
+
+    async def test_failed_warm_up_passes_slots_to_waiters(self):
+        async def factory():
+            await gate.wait()
+            raise OSError("connection refused")
+
+        gate = asyncio.Event()
+        pool = AsyncObjectPool(factory, max_size=2)
+        pool.min_size = 2
+        warm_up = asyncio.ensure_future(pool.warm_up())
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(pool.get()) for _ in range(2)]
+        await asyncio.sleep(0)
+        self.assertEqual(pool.waiting, 2)
+        pool.factory = self.factory
+        gate.set()
+        with self.assertRaises(OSError):
+            await warm_up
+        items = await asyncio.wait_for(asyncio.gather(*waiters), 1)
+        self.assertEqual(sorted(items), [0, 1])
+        self.assertEqual(pool.stats()["size"], 2)
+
+    async def test_cancelled_release_still_disposes_every_expired_object(self):
+        async def slow_dispose(item):
+            await asyncio.sleep(0.01)
+            self.disposed.append(item)
+
+        pool = self.make_pool(max_size=3, idle_ttl=1)
+        pool.dispose = slow_dispose
+        items = [await pool.get() for _ in range(3)]
+        await pool.put(items[0])
+        await pool.put(items[1])
+        self.clock.now = 5
+        release = asyncio.ensure_future(pool.put(items[2]))
+        await asyncio.sleep(0)
+        release.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await release
+        self.assertEqual(self.disposed, [])
+        self.assertEqual(pool.stats()["discarded"], 2)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.disposed, items[:2])
+        await pool.close()
+        self.assertEqual(self.disposed, items)
+
+    async def test_discarded_object_frees_its_slot_for_a_waiter(self):
+        pool = self.make_pool(max_size=1)
+        item = await pool.get()
+        waiting = asyncio.ensure_future(pool.get())
+        await asyncio.sleep(0)
+        await pool.discard(item)
+        self.assertEqual(await asyncio.wait_for(waiting, 1), 1)
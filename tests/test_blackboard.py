@@ -0,0 +1,470 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from patterns.other.blackboard import (
+    AbstractExpert,
+    AgendaController,
+    AsyncAbstractExpert,
+    AsyncController,
+    Blackboard,
+    Checkpointer,
+    ContributionLog,
+    Controller,
+    Delta,
+    ExpertProfiler,
+    ParallelController,
+    Professor,
+    Scientist,
+    Student,
+    TrackedState,
+)
+
+
+class Worker(AbstractExpert):
+    """Always eager, moves progress by a fixed step."""
+
+    depends_on = ()
+    step = 10
+
+    @property
+    def is_eager_to_contribute(self):
+        return True
+
+    def contribute(self):
+        state = self.blackboard.common_state
+        state["problems"] += 1
+        state["contributions"] += [self.__class__.__name__]
+        state["progress"] += self.step
+
+
+class Watcher(AbstractExpert):
+    """Only eager once there are enough problems, counts how often it is asked."""
+
+    depends_on = ("problems",)
+    threshold = 3
+
+    def __init__(self, blackboard):
+        super().__init__(blackboard)
+        self.checks = 0
+
+    @property
+    def is_eager_to_contribute(self):
+        self.checks += 1
+        return self.blackboard.common_state["problems"] >= self.threshold
+
+    def contribute(self):
+        state = self.blackboard.common_state
+        state["contributions"] += [self.__class__.__name__]
+        state["progress"] += 50
+
+
+class Bystander(Watcher):
+    depends_on = ("suggestions",)
+
+
+class AgendaControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.blackboard = Blackboard()
+
+    def test_state_shall_track_assigned_keys(self):
+        state = TrackedState(problems=0, contributions=[])
+        state["problems"] += 1
+        state["contributions"] += ["Student"]
+        self.assertEqual(state.pop_changed(), {"problems", "contributions"})
+        self.assertEqual(state.pop_changed(), set())
+
+    def test_experts_shall_only_be_asked_when_their_keys_change(self):
+        bystanders = [Bystander(self.blackboard) for _ in range(100)]
+        for expert in [Worker(self.blackboard)] + bystanders:
+            self.blackboard.add_expert(expert)
+        AgendaController(self.blackboard).run_loop()
+        self.assertEqual({expert.checks for expert in bystanders}, {1})
+
+    def test_higher_priority_shall_contribute_first(self):
+        watcher = Watcher(self.blackboard)
+        watcher.priority = 1
+        self.blackboard.add_expert(Worker(self.blackboard))
+        self.blackboard.add_expert(watcher)
+        contributions = AgendaController(self.blackboard).run_loop()
+        self.assertEqual(contributions, ["Worker"] * 3 + ["Watcher"] * 2)
+
+    def test_equal_priorities_shall_take_turns(self):
+        class Helper(Worker):
+            pass
+
+        self.blackboard.add_expert(Worker(self.blackboard))
+        self.blackboard.add_expert(Helper(self.blackboard))
+        contributions = AgendaController(self.blackboard).run_loop()
+        self.assertEqual(contributions, ["Worker", "Helper"] * 5)
+
+    def test_stalled_agenda_shall_raise(self):
+        self.blackboard.add_expert(Watcher(self.blackboard))
+        with self.assertRaises(RuntimeError):
+            AgendaController(self.blackboard).run_loop()
+
+
+class ContributionLogTest(unittest.TestCase):
+    def test_log_shall_behave_like_list_of_names(self):
+        log = ContributionLog(["Student", "Scientist"])
+        log += ["Student"]
+        log.append("Professor")
+        self.assertEqual(list(log), ["Student", "Scientist", "Student", "Professor"])
+        self.assertEqual(log.ids().tolist(), [0, 1, 0, 2])
+        self.assertEqual(len(log), 4)
+
+    def test_capped_log_shall_keep_latest_entries(self):
+        log = ContributionLog(cap=4)
+        names = [f"Expert{number % 3}" for number in range(11)]
+        log += names
+        self.assertEqual(log.to_list(), names[-4:])
+        self.assertEqual(log.last(2), names[-2:])
+        self.assertEqual(log.last(10), names[-4:])
+        self.assertEqual(log.total, 11)
+        self.assertEqual(log.counts(), {"Expert0": 4, "Expert1": 4, "Expert2": 3})
+
+    def test_last_shall_match_tail_at_every_ring_position(self):
+        for cap in (None, 5):
+            log = ContributionLog(cap=cap)
+            names = []
+            for number in range(13):
+                names.append(f"Expert{number}")
+                log.append(names[-1])
+                retained = log.to_list()
+                for count in range(-1, 8):
+                    expected = retained[-count:] if count > 0 else []
+                    self.assertEqual(log.last(count), expected)
+
+    def test_controllers_shall_fill_log(self):
+        blackboard = Blackboard(contributions=ContributionLog(cap=2))
+        blackboard.add_expert(Worker(blackboard))
+        log = AgendaController(blackboard).run_loop()
+        self.assertIsInstance(log, ContributionLog)
+        self.assertEqual((log.to_list(), log.total), (["Worker", "Worker"], 10))
+
+    def test_invalid_cap_shall_raise(self):
+        with self.assertRaises(ValueError):
+            ContributionLog(cap=0)
+
+
+class Fragile(Scientist):
+    """Crashes the run once there are enough problems, while `armed`."""
+
+    armed = False
+
+    def propose(self, rng):
+        if Fragile.armed and self.blackboard.common_state["problems"] >= 40:
+            raise KeyboardInterrupt
+        return super().propose(rng)
+
+
+class Finisher(Worker):
+    step = 100
+
+
+class Crasher(Finisher):
+    """Crashes on its first contribution, while `armed`."""
+
+    armed = False
+
+    def contribute(self):
+        if Crasher.armed:
+            raise KeyboardInterrupt
+        super().contribute()
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "run.ckpt")
+        self.addCleanup(setattr, Fragile, "armed", False)
+
+    @staticmethod
+    def new_blackboard():
+        blackboard = Blackboard(contributions=ContributionLog())
+        for expert_type in (Student, Fragile, Professor):
+            blackboard.add_expert(expert_type(blackboard))
+        return blackboard
+
+    def crash_and_resume(self, controller_type, **kwargs):
+        random.seed(42)
+        expected = self.new_blackboard()
+        controller_type(expected, **kwargs).run_loop()
+
+        random.seed(42)
+        Fragile.armed = True
+        with Checkpointer(self.path, every=3) as checkpointer:
+            blackboard = self.new_blackboard()
+            with self.assertRaises(KeyboardInterrupt):
+                controller_type(
+                    blackboard, checkpointer=checkpointer, **kwargs
+                ).run_loop()
+        Fragile.armed = False
+        controller = controller_type.resume(self.path, **kwargs)
+        self.assertGreater(controller.blackboard.common_state["progress"], 0)
+        controller.run_loop()
+        return expected.common_state, controller.blackboard.common_state
+
+    def test_resumed_run_shall_finish_like_uninterrupted_one(self):
+        expected, resumed = self.crash_and_resume(Controller)
+        self.assertEqual(
+            list(resumed.pop("contributions")), list(expected.pop("contributions"))
+        )
+        self.assertEqual(resumed, expected)
+
+    def test_run_resumed_mid_round_shall_finish_that_round(self):
+        def new_blackboard():
+            blackboard = Blackboard()
+            blackboard.add_expert(Finisher(blackboard))
+            blackboard.add_expert(Crasher(blackboard))
+            return blackboard
+
+        expected = Controller(new_blackboard()).run_loop()
+        self.addCleanup(setattr, Crasher, "armed", False)
+        Crasher.armed = True
+        with Checkpointer(self.path, every=1) as checkpointer:
+            with self.assertRaises(KeyboardInterrupt):
+                Controller(new_blackboard(), checkpointer).run_loop()
+        Crasher.armed = False
+        controller = Controller.resume(self.path)
+        self.assertEqual(controller.cursor, 1)
+        self.assertEqual(controller.run_loop(), expected)
+        self.assertEqual(expected, ["Finisher", "Crasher"])
+
+    def test_parallel_run_shall_resume_at_next_round(self):
+        expected, resumed = self.crash_and_resume(ParallelController, seed=5)
+        self.assertEqual(
+            list(resumed.pop("contributions")), list(expected.pop("contributions"))
+        )
+        self.assertEqual(resumed, expected)
+
+    def test_snapshots_shall_be_taken_every_n_contributions(self):
+        blackboard = self.new_blackboard()
+        with Checkpointer(self.path, every=4) as checkpointer:
+            log = Controller(blackboard, checkpointer).run_loop()
+        self.assertEqual(checkpointer.snapshots, log.total // 4)
+
+    def test_failed_write_shall_be_raised(self):
+        path = os.path.join(self.path, "missing", "run.ckpt")
+        blackboard = self.new_blackboard()
+        with self.assertRaises(OSError):
+            with Checkpointer(path, every=1) as checkpointer:
+                Controller(blackboard, checkpointer).run_loop()
+        self.assertEqual(checkpointer.snapshots, 0)
+        self.assertFalse(os.path.exists(path))
+
+    def test_foreign_file_shall_be_rejected(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a checkpoint")
+        with self.assertRaises(ValueError):
+            Checkpointer.load(self.path)
+
+
+class ExpertProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.blackboard = Blackboard()
+        self.worker = Worker(self.blackboard)
+        self.watcher = Watcher(self.blackboard)
+        self.blackboard.add_expert(self.worker)
+        self.blackboard.add_expert(self.watcher)
+
+    def test_stats_shall_count_checks_contributions_and_progress(self):
+        profiler = ExpertProfiler()
+        contributions = Controller(self.blackboard, profiler=profiler).run_loop()
+        worker, watcher = profiler.report().rows
+        self.assertEqual((worker.name, worker.position), ("Worker", 0))
+        self.assertEqual(worker.contributions, contributions.count("Worker"))
+        self.assertEqual(worker.progress, 10 * worker.contributions)
+        self.assertEqual(watcher.checks, self.watcher.checks)
+        self.assertEqual(watcher.progress, 50 * watcher.contributions)
+        self.assertGreater(worker.progress_per_second, 0)
+
+    def test_agenda_controller_shall_be_profiled(self):
+        profiler = ExpertProfiler()
+        contributions = AgendaController(self.blackboard, profiler=profiler).run_loop()
+        worker, watcher = profiler.report().rows
+        self.assertEqual(watcher.checks, self.watcher.checks)
+        self.assertEqual(
+            worker.contributions + watcher.contributions, len(contributions)
+        )
+
+    def test_slowest_expert_shall_be_reported(self):
+        self.blackboard.add_expert(Sleeper(self.blackboard, 0.01))
+        profiler = ExpertProfiler()
+        Controller(self.blackboard, profiler=profiler).run_loop()
+        self.assertEqual(profiler.report().slowest().name, "Sleeper")
+
+    def test_callback_shall_respect_interval(self):
+        reports = []
+        profiler = ExpertProfiler(reports.append, interval=3600)
+        Controller(self.blackboard, profiler=profiler).run_loop()
+        self.assertEqual(reports, [])
+        profiler = ExpertProfiler(reports.append, interval=0)
+        blackboard = Blackboard()
+        blackboard.add_expert(Worker(blackboard))
+        Controller(blackboard, profiler=profiler).run_loop()
+        self.assertEqual(
+            [report.rows[0].contributions for report in reports], list(range(1, 11))
+        )
+
+    def test_disabled_profiler_shall_not_wrap_experts(self):
+        controller = Controller(self.blackboard)
+        self.assertIs(controller._experts(), self.blackboard.experts)
+
+
+class Sleeper(AbstractExpert):
+    """Finishes later the earlier it was added, to shuffle completion order."""
+
+    def __init__(self, blackboard, delay):
+        super().__init__(blackboard)
+        self.delay = delay
+
+    @property
+    def is_eager_to_contribute(self):
+        return True
+
+    def propose(self, rng):
+        time.sleep(self.delay)
+        return Delta({"progress": 10}, [f"Sleeper{self.delay}"])
+
+
+class ParallelControllerTest(unittest.TestCase):
+    @staticmethod
+    def run_experts(controller_factory, expert_types=(Student, Professor)):
+        blackboard = Blackboard()
+        for expert_type in expert_types:
+            blackboard.add_expert(expert_type(blackboard))
+        controller_factory(blackboard).run_loop()
+        return blackboard.common_state
+
+    def test_same_seed_shall_give_same_result_with_any_workers(self):
+        results = [
+            self.run_experts(
+                lambda blackboard: ParallelController(blackboard, max_workers=workers)
+            )
+            for workers in (1, 2, 4)
+        ]
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertGreaterEqual(results[0]["progress"], 100)
+
+    def test_deltas_shall_be_merged_in_expert_order(self):
+        blackboard = Blackboard()
+        for delay in (0.03, 0.02, 0.01, 0):
+            blackboard.add_expert(Sleeper(blackboard, delay))
+        contributions = ParallelController(blackboard, max_workers=4).run_loop()
+        self.assertEqual(
+            contributions[:4], ["Sleeper0.03", "Sleeper0.02", "Sleeper0.01", "Sleeper0"]
+        )
+
+    def test_process_pool_shall_match_thread_pool(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            in_processes = self.run_experts(
+                lambda blackboard: ParallelController(blackboard, executor, seed=3)
+            )
+        in_threads = self.run_experts(
+            lambda blackboard: ParallelController(blackboard, seed=3)
+        )
+        self.assertEqual(in_processes, in_threads)
+
+    def test_experts_shall_propose_from_counters_without_blackboard(self):
+        seen = []
+
+        class Peeker(Sleeper):
+            def propose(self, rng):
+                seen.append(self.blackboard.common_state)
+                return super().propose(rng)
+
+        blackboard = Blackboard()
+        blackboard.add_expert(Peeker(blackboard, 0))
+        ParallelController(blackboard, max_workers=2).run_loop()
+        self.assertEqual(len(seen), 10)
+        self.assertNotIn("contributions", seen[-1])
+        self.assertEqual(seen[-1]["progress"], 90)
+        with self.assertRaises(TypeError):
+            seen[-1]["progress"] = 0
+        self.assertIs(blackboard.experts[0].blackboard, blackboard)
+
+    def test_delta_shall_apply_increments_and_contributions(self):
+        state = Blackboard().common_state
+        Delta({"problems": 2, "progress": 5}, ["Scientist"]).apply(state)
+        self.assertEqual(
+            state,
+            {
+                "problems": 2,
+                "suggestions": 0,
+                "contributions": ["Scientist"],
+                "progress": 5,
+            },
+        )
+        self.assertIsInstance(Scientist(Blackboard()).propose(random.Random(0)), Delta)
+
+
+class Caller(AsyncAbstractExpert):
+    """Waits on a fake remote service and records how many calls overlap."""
+
+    active = 0
+    peak = 0
+
+    def __init__(self, blackboard, delay=0.01, step=10):
+        super().__init__(blackboard)
+        self.delay = delay
+        self.step = step
+        self.cancelled = False
+
+    async def is_eager_to_contribute(self):
+        return True
+
+    async def contribute(self):
+        Caller.active += 1
+        Caller.peak = max(Caller.peak, Caller.active)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            Caller.active -= 1
+        self.blackboard.common_state["contributions"] += [self.__class__.__name__]
+        self.blackboard.common_state["progress"] += self.step
+
+
+class Failing(Caller):
+    async def contribute(self):
+        raise ValueError("service unavailable")
+
+
+class AsyncControllerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.blackboard = Blackboard()
+        Caller.active = Caller.peak = 0
+
+    async def test_concurrency_shall_be_limited(self):
+        for _ in range(12):
+            self.blackboard.add_expert(Caller(self.blackboard, step=1))
+        await AsyncController(self.blackboard, concurrency=3).run_loop()
+        self.assertEqual(Caller.peak, 3)
+        self.assertGreaterEqual(self.blackboard.common_state["progress"], 100)
+
+    async def test_outstanding_work_shall_be_cancelled_at_full_progress(self):
+        slow = Caller(self.blackboard, delay=60)
+        self.blackboard.add_expert(Caller(self.blackboard, step=100))
+        self.blackboard.add_expert(slow)
+        controller = AsyncController(self.blackboard)
+        contributions = await asyncio.wait_for(controller.run_loop(), timeout=5)
+        self.assertEqual(contributions, ["Caller"])
+        self.assertTrue(slow.cancelled)
+        self.assertEqual(controller.cancelled, 1)
+
+    async def test_expert_error_shall_cancel_round_and_propagate(self):
+        slow = Caller(self.blackboard, delay=60)
+        self.blackboard.add_expert(slow)
+        self.blackboard.add_expert(Failing(self.blackboard))
+        with self.assertRaises(ValueError):
+            await asyncio.wait_for(AsyncController(self.blackboard).run_loop(), 5)
+        self.assertTrue(slow.cancelled)
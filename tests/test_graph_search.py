@@ -0,0 +1,486 @@
+import os
+import tempfile
+import unittest
+from math import inf
+
+from patterns.other.graph_search import CompactGraph, GraphSearch, ReachabilityIndex
+
+GRAPH = {
+    "A": ["B", "C"],
+    "B": ["C", "D"],
+    "C": ["D", "G"],
+    "D": ["C"],
+    "E": ["F"],
+    "F": ["C"],
+    "G": ["E"],
+    "H": ["C"],
+}
+
+
+class ExplodingGraph(dict):
+    def get(self, *args):
+        raise AssertionError("graph shall not be traversed")
+
+
+class CompactGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.compact = CompactGraph.from_dict(GRAPH)
+
+    def test_compact_graph_shall_behave_like_source_dict(self):
+        self.assertEqual(dict(self.compact), GRAPH)
+        self.assertEqual(len(self.compact), len(GRAPH))
+        self.assertEqual(self.compact.edge_count, 11)
+
+    def test_nodes_known_only_as_targets_shall_be_interned(self):
+        compact = CompactGraph.from_dict({"A": ["B"], "B": ["C"]})
+        self.assertEqual(compact.labels, ["A", "B", "C"])
+        self.assertEqual(compact["C"], [])
+        self.assertEqual(compact.node_id("C"), 2)
+
+    def test_missing_node_shall_raise_key_error(self):
+        with self.assertRaises(KeyError):
+            self.compact["X"]
+        self.assertIsNone(self.compact.get("X"))
+        self.assertNotIn("X", self.compact)
+
+    def test_find_methods_shall_give_same_results_on_compact_graph(self):
+        plain, compact = GraphSearch(GRAPH), GraphSearch(self.compact)
+        for start in GRAPH:
+            for end in GRAPH:
+                for method in (
+                    "find_path_dfs",
+                    "find_all_paths_dfs",
+                    "find_shortest_path_dfs",
+                    "find_shortest_path_bfs",
+                ):
+                    self.assertEqual(
+                        getattr(plain, method)(start, end),
+                        getattr(compact, method)(start, end),
+                    )
+
+    def test_memory_usage_shall_report_total(self):
+        usage = self.compact.memory_usage()
+        self.assertEqual(
+            usage["total"],
+            usage["offsets"] + usage["targets"] + usage["labels"] + usage["index"],
+        )
+
+
+class IterativeEnginesTest(unittest.TestCase):
+    def setUp(self):
+        self.chain_length = 50000
+        self.chain = {node: [node + 1] for node in range(self.chain_length)}
+
+    def test_deep_graph_shall_not_hit_recursion_limit(self):
+        graph_search = GraphSearch(self.chain)
+        expected = list(range(self.chain_length + 1))
+        self.assertEqual(graph_search.find_path_dfs(0, self.chain_length), expected)
+        self.assertEqual(
+            graph_search.find_shortest_path_dfs(0, self.chain_length), expected
+        )
+        self.assertEqual(
+            graph_search.find_shortest_path_bfs(0, self.chain_length), expected
+        )
+
+    def test_shortest_path_dfs_shall_keep_first_of_equal_paths(self):
+        graph_search = GraphSearch(GRAPH)
+        self.assertEqual(graph_search.find_shortest_path_dfs("A", "D"), ["A", "B", "D"])
+
+    def test_missing_start_node_shall_return_none(self):
+        graph_search = GraphSearch(GRAPH)
+        self.assertIsNone(graph_search.find_shortest_path_bfs("X", "A"))
+        self.assertIsNone(graph_search.find_shortest_path_bidirectional("X", "A"))
+
+    def test_bidirectional_search_shall_match_bfs_length(self):
+        for graph in (GRAPH, CompactGraph.from_dict(GRAPH)):
+            graph_search = GraphSearch(graph)
+            for start in GRAPH:
+                for end in GRAPH:
+                    bfs = graph_search.find_shortest_path_bfs(start, end)
+                    both = graph_search.find_shortest_path_bidirectional(start, end)
+                    if bfs is None:
+                        self.assertIsNone(both)
+                    else:
+                        self.assertEqual(len(both), len(bfs))
+                        self.assertEqual((both[0], both[-1]), (start, end))
+
+    def test_reversed_compact_graph_shall_transpose_edges(self):
+        reverse = CompactGraph.from_dict(GRAPH).reversed()
+        self.assertEqual(reverse["C"], ["A", "B", "D", "F", "H"])
+        self.assertEqual(reverse["A"], [])
+
+
+class WeightedSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.weights = {
+            (node, neighbor): 1 + (ord(node) * 7 + ord(neighbor)) % 5
+            for node in GRAPH
+            for neighbor in GRAPH[node]
+        }
+
+    def brute_force_cost(self, graph_search, start, end):
+        paths = graph_search.find_all_paths_dfs(start, end)
+        return min((graph_search.path_cost(path) for path in paths), default=None)
+
+    def test_dijkstra_shall_find_cheapest_path(self):
+        graph_search = GraphSearch(GRAPH, self.weights)
+        for start in GRAPH:
+            for end in GRAPH:
+                path = graph_search.find_shortest_path_dijkstra(start, end)
+                expected = self.brute_force_cost(graph_search, start, end)
+                if expected is None:
+                    self.assertIsNone(path)
+                else:
+                    self.assertEqual(graph_search.path_cost(path), expected)
+
+    def test_weights_shall_accept_callable_and_compact_graph(self):
+        by_mapping = GraphSearch(GRAPH, self.weights)
+        by_callable = GraphSearch(
+            GRAPH, lambda node, neighbor: self.weights[node, neighbor]
+        )
+        compact = GraphSearch(CompactGraph.from_dict(GRAPH, self.weights))
+        for start in GRAPH:
+            for end in GRAPH:
+                expected = by_mapping.find_shortest_path_dijkstra(start, end)
+                self.assertEqual(
+                    by_callable.find_shortest_path_dijkstra(start, end), expected
+                )
+                self.assertEqual(compact.find_shortest_path_astar(start, end), expected)
+
+    def test_astar_heuristic_shall_not_change_cost(self):
+        graph_search = GraphSearch(GRAPH, self.weights)
+        reverse = GraphSearch(CompactGraph.from_dict(GRAPH, self.weights).reversed())
+        for end in GRAPH:
+            to_end = reverse.shortest_path_tree(end)
+
+            def heuristic(node, _end):
+                return to_end.distance_to(node) or 0
+
+            for start in GRAPH:
+                path = graph_search.find_shortest_path_astar(start, end, heuristic)
+                expected = self.brute_force_cost(graph_search, start, end)
+                if expected is None:
+                    self.assertIsNone(path)
+                else:
+                    self.assertEqual(graph_search.path_cost(path), expected)
+
+    def test_shortest_path_tree_shall_be_cached_and_reused(self):
+        graph_search = GraphSearch(GRAPH, self.weights)
+        tree = graph_search.shortest_path_tree("A")
+        self.assertIs(graph_search.shortest_path_tree("A"), tree)
+        self.assertEqual(
+            graph_search.find_shortest_path_dijkstra("A", "F"), tree.path_to("F")
+        )
+        self.assertNotIn("H", tree)
+
+    def test_negative_weight_shall_raise_value_error(self):
+        graph_search = GraphSearch(GRAPH, lambda node, neighbor: -1)
+        with self.assertRaises(ValueError):
+            graph_search.find_shortest_path_dijkstra("A", "F")
+
+
+class IterAllPathsTest(unittest.TestCase):
+    def setUp(self):
+        self.graph_search = GraphSearch(GRAPH)
+
+    def test_paths_shall_be_yielded_lazily(self):
+        # complete graph: enumerating every path would never finish in a test
+        graph = {
+            node: [other for other in range(20) if other != node] for node in range(20)
+        }
+        paths = GraphSearch(graph).iter_all_paths(0, 19)
+        self.assertEqual(next(paths), list(range(20)))
+
+    def test_yielded_paths_shall_be_independent_copies(self):
+        paths = list(self.graph_search.iter_all_paths("A", "D"))
+        paths[0].append("X")
+        self.assertEqual(paths[1:], [["A", "B", "D"], ["A", "C", "D"]])
+
+    def test_limits_shall_cut_enumeration(self):
+        self.assertEqual(
+            list(self.graph_search.iter_all_paths("A", "F", max_depth=3)), []
+        )
+        self.assertEqual(
+            list(self.graph_search.iter_all_paths("A", "F", max_depth=4)),
+            [["A", "C", "G", "E", "F"]],
+        )
+        self.assertEqual(
+            list(self.graph_search.iter_all_paths("A", "D", max_paths=0)), []
+        )
+
+
+class ShortestPathsTest(unittest.TestCase):
+    def setUp(self):
+        weights = {(node, neighbor): 1 for node in GRAPH for neighbor in GRAPH[node]}
+        weights["B", "D"] = 5
+        self.graph_search = GraphSearch(GRAPH, weights)
+
+    def test_paths_shall_be_yielded_in_cost_order(self):
+        for start in GRAPH:
+            for end in GRAPH:
+                paths = list(self.graph_search.iter_shortest_paths(start, end))
+                self.assertCountEqual(
+                    paths, self.graph_search.find_all_paths_dfs(start, end)
+                )
+                costs = [self.graph_search.path_cost(path) for path in paths]
+                self.assertEqual(costs, sorted(costs))
+
+    def test_top_paths_shall_not_enumerate_whole_graph(self):
+        # complete graph: there are about 10^17 simple paths between two nodes
+        graph = {
+            node: [other for other in range(20) if other != node] for node in range(20)
+        }
+        paths = list(GraphSearch(graph).iter_shortest_paths(0, 19, max_paths=20))
+        self.assertEqual(paths[0], [0, 19])
+        self.assertEqual(sorted(map(len, paths[1:])), [3] * 18 + [4])
+        self.assertEqual(len(set(map(tuple, paths))), 20)
+
+    def test_unreachable_end_shall_yield_nothing(self):
+        self.assertEqual(list(self.graph_search.iter_shortest_paths("A", "H")), [])
+        self.assertEqual(list(self.graph_search.iter_shortest_paths("A", "X")), [])
+        self.assertEqual(list(self.graph_search.iter_shortest_paths("A", "A")), [["A"]])
+
+
+class MultiSourceBfsTest(unittest.TestCase):
+    def test_rows_shall_match_single_source_bfs(self):
+        graph = {
+            node: [(node * 7 + 3) % 40, (node * 11 + 5) % 40] for node in range(40)
+        }
+        graph_search = GraphSearch(graph)
+        # more sources than bits in a machine word
+        sources = list(range(40)) * 2
+        rows = graph_search.multi_source_bfs(sources)
+        node_id = graph_search.as_compact().node_id
+        for source, row in zip(sources, rows):
+            for end in graph:
+                path = graph_search.find_shortest_path_bfs(source, end)
+                expected = -1 if path is None else len(path) - 1
+                self.assertEqual(row[node_id(end)], expected)
+
+    def test_max_depth_shall_cut_distances(self):
+        graph_search = GraphSearch(GRAPH)
+        labels = graph_search.as_compact().labels
+        (row,) = graph_search.multi_source_bfs(["A"], max_depth=2)
+        self.assertEqual(
+            dict(zip(labels, row)),
+            {"A": 0, "B": 1, "C": 1, "D": 2, "E": -1, "F": -1, "G": 2, "H": -1},
+        )
+
+    def test_unknown_source_shall_reach_nothing(self):
+        rows = GraphSearch(GRAPH).multi_source_bfs(["X", "H"])
+        self.assertEqual(set(rows[0]), {-1})
+        self.assertEqual(rows[1].tolist(), [-1, -1, 1, 2, 3, 4, 2, 0])
+
+
+class ReachabilityIndexTest(unittest.TestCase):
+    def test_index_shall_agree_with_search(self):
+        for graph in (GRAPH, CompactGraph.from_dict(GRAPH)):
+            for bitset_limit in (0, 100):
+                index = ReachabilityIndex(graph, bitset_limit)
+                graph_search = GraphSearch(graph)
+                for start in GRAPH:
+                    for end in GRAPH:
+                        expected = graph_search.find_path_dfs(start, end) is not None
+                        self.assertEqual(index.reachable(start, end), expected)
+                        if expected:
+                            self.assertTrue(index.maybe_reachable(start, end))
+
+    def test_index_shall_cut_unreachable_queries(self):
+        graph_search = GraphSearch(GRAPH)
+        graph_search.build_reachability_index()
+        graph_search.graph = ExplodingGraph()
+        self.assertIsNone(graph_search.find_path_dfs("C", "H"))
+        self.assertIsNone(graph_search.find_shortest_path_bfs("A", "H"))
+        self.assertEqual(list(graph_search.iter_all_paths("E", "A")), [])
+
+    def test_deep_graph_shall_not_hit_recursion_limit(self):
+        chain = {node: [node + 1] for node in range(50000)}
+        chain[50000] = [0]
+        index = ReachabilityIndex(chain)
+        self.assertEqual(index.component_count, 1)
+        self.assertTrue(index.reachable(50000, 1))
+
+
+class BatchQueriesTest(unittest.TestCase):
+    def setUp(self):
+        self.graph_search = GraphSearch(GRAPH)
+        self.pairs = [(start, end) for start in GRAPH for end in list(GRAPH) + ["X"]]
+        self.expected = [
+            self.graph_search.find_shortest_path_bfs(start, end)
+            for start, end in self.pairs
+        ]
+
+    def test_batch_shall_match_single_queries_in_input_order(self):
+        self.assertEqual(
+            self.graph_search.find_paths_batch(self.pairs, max_workers=1), self.expected
+        )
+
+    def test_batch_shall_run_in_process_pool(self):
+        self.assertEqual(
+            self.graph_search.find_paths_batch(self.pairs, max_workers=2, chunksize=5),
+            self.expected,
+        )
+
+    def test_batch_shall_use_reachability_index(self):
+        self.graph_search.build_reachability_index()
+        self.assertEqual(
+            self.graph_search.find_paths_batch(self.pairs, max_workers=1), self.expected
+        )
+
+
+class MappedGraphTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "graph.csr")
+
+    def test_loaded_graph_shall_match_saved_graph(self):
+        CompactGraph.from_dict(GRAPH).save(self.path)
+        mapped = CompactGraph.load(self.path)
+        self.assertEqual(dict(mapped), GRAPH)
+        self.assertEqual(mapped.node_id("H"), 7)
+        self.assertIsNone(mapped.node_id("X"))
+        self.assertIsNone(mapped.node_id(1))
+        with self.assertRaises(KeyError):
+            mapped["X"]
+
+    def test_search_methods_shall_work_on_loaded_graph(self):
+        weights = {
+            (node, neighbor): len(node + neighbor)
+            for node in GRAPH
+            for neighbor in GRAPH[node]
+        }
+        CompactGraph.from_dict(GRAPH, weights).save(self.path)
+        plain = GraphSearch(GRAPH, weights)
+        mapped = GraphSearch(CompactGraph.load(self.path))
+        mapped.build_reachability_index()
+        for start in GRAPH:
+            for end in GRAPH:
+                for method in (
+                    "find_path_dfs",
+                    "find_shortest_path_bfs",
+                    "find_shortest_path_bidirectional",
+                    "find_shortest_path_dijkstra",
+                ):
+                    self.assertEqual(
+                        getattr(mapped, method)(start, end),
+                        getattr(plain, method)(start, end),
+                    )
+        pairs = [(start, end) for start in GRAPH for end in GRAPH]
+        self.assertEqual(
+            mapped.find_paths_batch(pairs, max_workers=2),
+            plain.find_paths_batch(pairs, max_workers=1),
+        )
+
+    def test_non_string_labels_shall_not_be_saved(self):
+        with self.assertRaises(TypeError):
+            CompactGraph.from_dict({1: [2]}).save(self.path)
+
+    def test_foreign_file_shall_be_rejected(self):
+        with open(self.path, "wb") as file:
+            file.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            CompactGraph.load(self.path)
+
+
+class LandmarkIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.graph_search = GraphSearch(GRAPH)
+        self.landmarks = self.graph_search.build_landmarks(k=3, seed=0)
+
+    def test_bounds_shall_enclose_true_distance(self):
+        for start in GRAPH:
+            tree = self.graph_search.shortest_path_tree(start)
+            for end in GRAPH:
+                distance = tree.distance_to(end)
+                lower = self.landmarks.lower_bound(start, end)
+                upper = self.landmarks.upper_bound(start, end)
+                if distance is None:
+                    self.assertEqual(upper, inf)
+                else:
+                    self.assertLessEqual(lower, distance)
+                    self.assertLessEqual(distance, upper)
+
+    def test_astar_with_landmarks_shall_find_shortest_paths(self):
+        plain = GraphSearch(GRAPH)
+        for start in GRAPH:
+            for end in GRAPH:
+                path = self.graph_search.find_shortest_path_astar(start, end)
+                expected = plain.find_shortest_path_bfs(start, end)
+                if expected is None:
+                    self.assertIsNone(path)
+                else:
+                    self.assertEqual(len(path), len(expected))
+
+    def test_stats_shall_report_preprocessing_cost(self):
+        self.assertEqual(self.landmarks.stats["landmarks"], 3)
+        self.assertEqual(self.landmarks.stats["bytes"], 3 * 2 * 8 * len(GRAPH))
+        self.assertGreaterEqual(self.landmarks.stats["seconds"], 0)
+
+
+class DynamicGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = {node: list(neighbors) for node, neighbors in GRAPH.items()}
+        self.weights = {
+            (node, neighbor): 1 for node in GRAPH for neighbor in GRAPH[node]
+        }
+        self.graph_search = GraphSearch(self.graph, self.weights)
+
+    def assert_caches_match_fresh_search(self):
+        fresh = GraphSearch(
+            {node: list(neighbors) for node, neighbors in self.graph.items()},
+            dict(self.weights),
+        )
+        for source, tree in self.graph_search._trees.items():
+            self.assertEqual(tree.dist, fresh.shortest_path_tree(source).dist)
+        for start in GRAPH:
+            for end in GRAPH:
+                if fresh.find_path_dfs(start, end) is None:
+                    self.assertTrue(self.graph_search._unreachable(start, end))
+                else:
+                    self.assertFalse(self.graph_search._unreachable(start, end))
+
+    def test_add_edge_shall_shorten_cached_trees(self):
+        tree = self.graph_search.shortest_path_tree("A")
+        self.graph_search.build_reachability_index()
+        self.graph_search.add_edge("A", "F", 1)
+        self.assertIs(self.graph_search.shortest_path_tree("A"), tree)
+        self.assertEqual(tree.path_to("F"), ["A", "F"])
+        self.graph_search.add_edge("E", "H", 2)
+        self.assert_caches_match_fresh_search()
+
+    def test_remove_edge_shall_repair_cached_trees(self):
+        for source in GRAPH:
+            self.graph_search.shortest_path_tree(source)
+        self.graph_search.build_reachability_index()
+        self.graph_search.remove_edge("C", "G")
+        self.assertIsNone(self.graph_search.shortest_path_tree("A").path_to("E"))
+        self.assert_caches_match_fresh_search()
+        self.graph_search.add_edge("B", "G", 5)
+        self.assert_caches_match_fresh_search()
+
+    def test_reweighting_parallel_edge_shall_repair_cached_trees(self):
+        self.graph_search.shortest_path_tree("A")
+        self.graph_search.add_edge("A", "C", 3)
+        self.assertEqual(self.graph_search.shortest_path_tree("A").distance_to("C"), 2)
+
+    def test_landmark_bounds_shall_stay_valid(self):
+        landmarks = self.graph_search.build_landmarks(k=2, seed=3)
+        self.graph_search.remove_edge("C", "D")
+        self.graph_search.add_edge("D", "X", 1)
+        self.graph_search.add_edge("X", "A", 1)
+        for start in list(GRAPH) + ["X"]:
+            tree = GraphSearch(self.graph, self.weights).shortest_path_tree(start)
+            for end, distance in tree.dist.items():
+                self.assertLessEqual(landmarks.lower_bound(start, end), distance)
+                self.assertGreaterEqual(landmarks.upper_bound(start, end), distance)
+
+    def test_invalid_updates_shall_raise(self):
+        with self.assertRaises(KeyError):
+            self.graph_search.remove_edge("A", "H")
+        with self.assertRaises(ValueError):
+            self.graph_search.add_edge("A", "H")
+        with self.assertRaises(TypeError):
+            GraphSearch(GRAPH).add_edge("A", "H", 1)
+        with self.assertRaises(TypeError):
+            GraphSearch(CompactGraph.from_dict(GRAPH)).add_edge("A", "H")
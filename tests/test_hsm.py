@@ -1,14 +1,20 @@
+import asyncio
 import unittest
 from unittest.mock import patch
 
 from patterns.other.hsm.hsm import (
     Active,
+    Failed,
     HierachicalStateMachine,
+    HsmFleet,
+    HsmRunner,
     Standby,
     Suspect,
+    TraceRecorder,
     UnsupportedMessageType,
     UnsupportedState,
     UnsupportedTransition,
+    replay,
 )
 
 
@@ -97,3 +103,288 @@ class StandbyStateTest(unittest.TestCase):
         with cls.assertRaises(UnsupportedTransition):
             cls.hsm.on_message("operator inservice")
         cls.assertEqual(isinstance(cls.hsm._current_state, Standby), True)
+
+
+class TransitionTableTest(unittest.TestCase):
+    def setUp(cls):
+        cls.hsm = HierachicalStateMachine()
+
+    def test_table_shall_flatten_inherited_handlers(cls):
+        table = HierachicalStateMachine.table
+        cls.assertEqual(
+            table.lookup("active", "fault trigger"),
+            (
+                ("_perform_switchover", "_send_diagnostics_request", "_raise_alarm"),
+                "suspect",
+            ),
+        )
+        cls.assertEqual(
+            table.lookup("failed", "operator inservice"),
+            (("_send_operator_inservice_response",), "suspect"),
+        )
+        cls.assertIsNone(table.lookup("failed", "switchover"))
+        cls.assertEqual(len(table.transitions), len(table.states) * table.message_count)
+
+    def test_dispatch_shall_follow_current_state(cls):
+        cls.hsm.on_message("switchover")
+        cls.assertIsInstance(cls.hsm._current_state, Active)
+        cls.hsm.on_message("switchover")
+        cls.assertIsInstance(cls.hsm._current_state, Standby)
+
+    def test_given_suspect_messages_shall_walk_out_of_service_states(cls):
+        cls.hsm.on_message("fault trigger")
+        cls.hsm.on_message("diagnostics failed")
+        cls.assertIsInstance(cls.hsm._current_state, Failed)
+        with cls.assertRaises(UnsupportedTransition):
+            cls.hsm.on_message("fault trigger")
+        cls.hsm.on_message("operator inservice")
+        cls.assertIsInstance(cls.hsm._current_state, Suspect)
+        with patch.object(cls.hsm, "_clear_alarm") as mock_clear_alarm:
+            cls.hsm.on_message("diagnostics passed")
+        cls.assertEqual(mock_clear_alarm.call_count, 1)
+        cls.assertIsInstance(cls.hsm._current_state, Standby)
+
+    def test_given_active_on_message_fault_trigger_shall_switch_over_and_raise_alarm(
+        cls,
+    ):
+        cls.hsm._current_state = Active
+        with patch.object(
+            cls.hsm, "_perform_switchover"
+        ) as mock_perform_switchover, patch.object(
+            cls.hsm, "_raise_alarm"
+        ) as mock_raise_alarm:
+            cls.hsm.on_message("fault trigger")
+        cls.assertEqual(mock_perform_switchover.call_count, 1)
+        cls.assertEqual(mock_raise_alarm.call_count, 1)
+        cls.assertIsInstance(cls.hsm._current_state, Suspect)
+
+
+class HsmFleetTest(unittest.TestCase):
+    def setUp(cls):
+        cls.fleet = HsmFleet(4)
+
+    def test_fleet_shall_start_in_initial_state(cls):
+        cls.assertEqual(cls.fleet.state_counts()["standby"], 4)
+        cls.assertEqual(len(cls.fleet.states), 4)
+
+    def test_broadcast_message_shall_move_every_unit(cls):
+        step = cls.fleet.apply("fault trigger")
+        cls.assertEqual(cls.fleet.state_counts()["suspect"], 4)
+        cls.assertEqual(step.counts["_raise_alarm"], 4)
+        cls.assertEqual(step.counts["_perform_switchover"], 0)
+
+    def test_per_unit_messages_shall_match_single_machines(cls):
+        messages = ["switchover", "fault trigger", None, "diagnostics passed"]
+        machines = [HierachicalStateMachine() for _ in messages]
+        for _ in range(3):
+            step = cls.fleet.apply(cls.fleet.encode(messages))
+            for unit, (machine, message) in enumerate(zip(machines, messages)):
+                if message is not None:
+                    try:
+                        machine.on_message(message)
+                    except UnsupportedTransition:
+                        pass
+                cls.assertIsInstance(
+                    machine._current_state,
+                    type(machine.states[cls.fleet.state_of(unit)]),
+                )
+        cls.assertEqual(list(step.unsupported), [0, 1, 0, 1])
+        cls.assertEqual(list(step.actions["_perform_switchover"]), [1, 0, 0, 0])
+
+    def test_unsupported_transition_shall_be_flagged_and_keep_state(cls):
+        step = cls.fleet.apply("diagnostics failed")
+        cls.assertEqual(step.unsupported_count, 4)
+        cls.assertEqual(cls.fleet.state_counts()["standby"], 4)
+
+    def test_invalid_messages_shall_raise_exception(cls):
+        with cls.assertRaises(UnsupportedMessageType):
+            cls.fleet.apply("trigger")
+        with cls.assertRaises(UnsupportedMessageType):
+            cls.fleet.apply(bytes([200]) * 4)
+        with cls.assertRaises(ValueError):
+            cls.fleet.apply(bytes(3))
+
+
+class HsmRunnerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(cls):
+        cls.hsm = HierachicalStateMachine()
+
+    async def run_until_handled(cls, runner):
+        task = asyncio.ensure_future(runner.run())
+        try:
+            await asyncio.wait_for(runner.join(), timeout=5)
+        finally:
+            task.cancel()
+
+    async def test_queued_messages_shall_be_handled_in_batches(cls):
+        runner = HsmRunner(cls.hsm, batch_size=4)
+        for _ in range(10):
+            await runner.submit("switchover")
+        await cls.run_until_handled(runner)
+        metrics = runner.metrics()
+        cls.assertEqual((metrics["processed"], metrics["batches"]), (10, 3))
+        cls.assertEqual((metrics["depth"], metrics["max_depth"]), (0, 10))
+        cls.assertGreaterEqual(metrics["latency_max"], metrics["latency_mean"])
+        cls.assertIsInstance(cls.hsm._current_state, Standby)
+
+    async def test_block_policy_shall_apply_backpressure(cls):
+        runner = HsmRunner(cls.hsm, maxsize=2)
+        await runner.submit("switchover")
+        await runner.submit("switchover")
+        blocked = asyncio.ensure_future(runner.submit("fault trigger"))
+        await asyncio.sleep(0.01)
+        cls.assertFalse(blocked.done())
+        await cls.run_until_handled(runner)
+        cls.assertTrue(await blocked)
+        cls.assertIsInstance(cls.hsm._current_state, Suspect)
+
+    async def test_drop_policies_shall_keep_queue_bounded(cls):
+        messages = ["fault trigger", "diagnostics failed", "operator inservice"]
+        for policy, expected in (("drop_newest", Failed), ("drop_oldest", Standby)):
+            hsm = HierachicalStateMachine()
+            runner = HsmRunner(hsm, maxsize=2, policy=policy)
+            accepted = [await runner.submit(message) for message in messages]
+            await cls.run_until_handled(runner)
+            cls.assertEqual(runner.dropped, 1)
+            cls.assertEqual(accepted[-1], policy == "drop_oldest")
+            cls.assertIsInstance(hsm._current_state, expected)
+
+    async def test_unsupported_messages_shall_be_counted(cls):
+        runner = HsmRunner(cls.hsm)
+        for message in ("diagnostics failed", "trigger", "fault trigger"):
+            await runner.submit(message)
+        await cls.run_until_handled(runner)
+        cls.assertEqual(runner.metrics()["errors"], 2)
+        cls.assertIsInstance(cls.hsm._current_state, Suspect)
+
+    async def test_failing_actions_shall_be_counted_and_batch_finished(cls):
+        class Faulty(HierachicalStateMachine):
+            def _raise_alarm(self):
+                raise RuntimeError("alarm bus down")
+
+        hsm = Faulty()
+        runner = HsmRunner(hsm)
+        for message in ("fault trigger", "diagnostics passed", "switchover"):
+            await runner.submit(message)
+        await cls.run_until_handled(runner)
+        metrics = runner.metrics()
+        cls.assertEqual((metrics["processed"], metrics["depth"]), (3, 0))
+        cls.assertEqual(metrics["errors"], 2)
+        cls.assertIsInstance(hsm._current_state, Active)
+
+    async def test_unsupported_state_shall_be_counted(cls):
+        runner = HsmRunner(cls.hsm)
+        with patch.object(cls.hsm, "_next_state", side_effect=UnsupportedState):
+            await runner.submit("switchover")
+            await runner.submit("switchover")
+            await cls.run_until_handled(runner)
+        cls.assertEqual((runner.processed, runner.errors), (2, 2))
+
+    def test_unknown_policy_shall_raise(cls):
+        with cls.assertRaises(ValueError):
+            HsmRunner(cls.hsm, policy="drop_all")
+
+
+class TraceRecorderTest(unittest.TestCase):
+    def setUp(cls):
+        cls.hsm = HierachicalStateMachine()
+        cls.trace = cls.hsm.enable_trace(capacity=4)
+
+    def test_messages_shall_be_recorded_with_their_state(cls):
+        cls.hsm.on_message("switchover")
+        cls.hsm.on_message("fault trigger")
+        table = cls.hsm.table
+        cls.assertEqual(
+            [(state, message) for _, state, message in cls.trace],
+            [
+                (table.state_ids["standby"], table.message_ids["switchover"]),
+                (table.state_ids["active"], table.message_ids["fault trigger"]),
+            ],
+        )
+        cls.assertEqual(len(cls.trace.dump()), 2 * TraceRecorder.RECORD.size)
+
+    def test_full_buffer_shall_keep_newest_records(cls):
+        for _ in range(6):
+            cls.hsm.on_message("switchover")
+        records = list(cls.trace)
+        cls.assertEqual((len(records), cls.trace.dropped), (4, 2))
+        timestamps = [timestamp for timestamp, _, _ in records]
+        cls.assertEqual(timestamps, sorted(timestamps))
+
+    def test_replay_shall_reproduce_the_recorded_run(cls):
+        cls.hsm.on_message("fault trigger")
+        with cls.assertRaises(UnsupportedTransition):
+            cls.hsm.on_message("switchover")
+        cls.hsm.on_message("diagnostics failed")
+        cls.hsm.on_message("operator inservice")
+        steps = replay(cls.trace.dump())
+        cls.assertEqual(
+            [step[1:] for step in steps],
+            [
+                ("standby", "fault trigger", "suspect"),
+                ("suspect", "switchover", "UnsupportedTransition"),
+                ("suspect", "diagnostics failed", "failed"),
+                ("failed", "operator inservice", "suspect"),
+            ],
+        )
+
+    def test_replay_of_a_wrapped_trace_shall_start_in_its_first_state(cls):
+        for message in (
+            "fault trigger",
+            "diagnostics failed",
+            "operator inservice",
+            "diagnostics passed",
+            "switchover",
+        ):
+            cls.hsm.on_message(message)
+        machine = HierachicalStateMachine()
+        steps = replay(cls.trace, machine)
+        cls.assertEqual(steps[0][1], "suspect")
+        cls.assertIsInstance(machine._current_state, Active)
+
+    def test_non_contiguous_trace_shall_raise(cls):
+        cls.hsm.on_message("switchover")
+        cls.hsm._current_state = Standby
+        cls.hsm.on_message("switchover")
+        with cls.assertRaises(ValueError):
+            replay(cls.trace)
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(cls):
+        cls.machines = [HierachicalStateMachine() for _ in range(6)]
+        for machine in cls.machines[::2]:
+            machine.on_message("fault trigger")
+        cls.machines[0].on_message("diagnostics failed")
+
+    def test_restore_shall_rebuild_every_state(cls):
+        data = HierachicalStateMachine.snapshot(cls.machines)
+        restored = HierachicalStateMachine.restore(data)
+        cls.assertEqual(
+            [type(machine._current_state) for machine in restored],
+            [type(machine._current_state) for machine in cls.machines],
+        )
+        cls.assertIsInstance(restored[0]._current_state, Failed)
+
+    def test_snapshot_shall_store_one_byte_per_machine(cls):
+        one = HierachicalStateMachine.snapshot(cls.machines[:1])
+        many = HierachicalStateMachine.snapshot(cls.machines)
+        cls.assertEqual(len(many) - len(one), len(cls.machines) - 1)
+
+    def test_restored_machines_shall_share_states_and_run_independently(cls):
+        restored = HierachicalStateMachine.restore(
+            HierachicalStateMachine.snapshot(cls.machines)
+        )
+        cls.assertIs(restored[1].states, restored[3].states)
+        cls.assertIsNone(restored[1]._current_state._hsm)
+        cls.assertFalse(hasattr(restored[1], "_standby_state"))
+        restored[1].on_message("switchover")
+        cls.assertIsInstance(restored[1]._current_state, Active)
+        cls.assertIsInstance(restored[3]._current_state, Standby)
+
+    def test_invalid_snapshot_shall_raise(cls):
+        with cls.assertRaises(ValueError):
+            HierachicalStateMachine.restore(b"pickle")
+        data = HierachicalStateMachine.snapshot(cls.machines[:1])
+        with cls.assertRaises(UnsupportedState):
+            HierachicalStateMachine.restore(data[:-1] + bytes([9]))